@@ -0,0 +1,48 @@
+# планировщик решений вражеских танков
+# работа танка делится на "решение" (обзор, выбор цели, повороты, выстрел) и "действие"
+# (движение по выбранному плану); действие выполняется каждый шаг логики, а решения
+# распределяются по шагам в пределах бюджета, поэтому время шага почти не зависит от числа танков
+
+THINK_BUDGET_US = 1000  # бюджет решений на шаг логики (микросекунды)
+THINK_COST_US = 50  # условная стоимость одного решения (микросекунды)
+NEAR_DISTANCE = 700  # танки ближе этого расстояния до игрока (примерно экран) решают в первую очередь
+NEAR_INTERVAL = 1  # шагов логики между решениями танка рядом с игроком
+FAR_INTERVAL = 15  # и танка вдали от него
+
+
+# бюджет задаётся в микросекундах, но переводится в число решений за шаг по условной стоимости
+# решения, а не измеряется по часам: иначе бой зависел бы от скорости компьютера,
+# и записи боёв (replay.py) и пакетные прогоны перестали бы повторяться
+class AIScheduler:
+    def __init__(self, budget_us=THINK_BUDGET_US, think_cost_us=THINK_COST_US,
+                 near_distance=NEAR_DISTANCE, near_interval=NEAR_INTERVAL, far_interval=FAR_INTERVAL):
+        self.thinks_per_tick = max(1, budget_us // think_cost_us)
+        self.near_distance = near_distance
+        self.near_interval = near_interval
+        self.far_interval = far_interval
+        self.thinks = 0  # счётчики для профилировщика: принятые и отложенные решения
+        self.deferred = 0
+
+    # один шаг логики
+    # agents - танки с методами think и act и атрибутами rect, is_alive и next_think
+    # (номер шага следующего решения хранится в самом танке и входит в снимки состояния боя),
+    # target - прямоугольник игрока, tick - номер шага игровых часов
+    def update(self, agents, target, tick):
+        tx, ty = target.center
+        near_squared = self.near_distance * self.near_distance
+        alive = [agent for agent in agents if agent.is_alive]
+        due = []
+        for order, agent in enumerate(alive):
+            if agent.next_think <= tick:
+                x, y = agent.rect.center
+                near = (x - tx) * (x - tx) + (y - ty) * (y - ty) <= near_squared
+                # сначала танки рядом с игроком, среди остальных - дольше всех ждущие
+                due.append((not near, agent.next_think, order, agent))
+        due.sort(key=lambda item: item[:3])
+        for far, _, _, agent in due[:self.thinks_per_tick]:
+            agent.think()
+            agent.next_think = tick + (self.far_interval if far else self.near_interval)
+        self.thinks += min(len(due), self.thinks_per_tick)
+        self.deferred += max(0, len(due) - self.thinks_per_tick)
+        for agent in alive:
+            agent.act()
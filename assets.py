@@ -0,0 +1,136 @@
+from collections import OrderedDict
+
+import pygame
+
+# углы, для которых повёрнутые изображения хранятся постоянно
+CARDINAL_ANGLES = (0, 90, 180, 270)
+
+
+# приведение пути к единому виду, чтобы r"a\b.png" и "a/b.png" были одним ключом кэша
+def normalize_path(path):
+    return path.replace("\\", "/")
+
+
+# звук-заглушка для запуска без звуковой системы
+class NullSound:
+    def __init__(self, path=None):
+        pass
+
+    def play(self, *args, **kwargs):
+        pass
+
+    def stop(self):
+        pass
+
+    def fadeout(self, time):
+        pass
+
+    def set_volume(self, value):
+        pass
+
+
+# лист поворотов: изображение, заранее повёрнутое на directions равных углов
+# base_angle - угол (в игровых координатах), в сторону которого смотрит исходное изображение
+class RotationSheet:
+    def __init__(self, image, directions=4, base_angle=270):
+        self.directions = directions
+        self.step = 360 / directions
+        self.frames = [pygame.transform.rotate(image, base_angle - i * self.step)
+                       for i in range(directions)]
+
+    # кадр для угла angle, округлённого до ближайшего направления листа
+    def frame(self, angle):
+        return self.frames[round((angle % 360) / self.step) % self.directions]
+
+
+# хранилище загруженных ресурсов, общих для всех игровых объектов
+# каждое изображение и звук читаются с диска один раз,
+# повороты на 0/90/180/270 градусов кэшируются навсегда,
+# а повороты на остальные углы - в ограниченном LRU-кэше
+class AssetManager:
+    def __init__(self, image_loader, variant_limit=64, sound_loader=pygame.mixer.Sound):
+        self.image_loader = image_loader  # функция (путь, colorkey) -> Surface
+        self.sound_loader = sound_loader  # функция (путь) -> звук
+        self.variant_limit = variant_limit
+        self.images = {}
+        self.rotations = {}
+        self.variants = OrderedDict()
+        self.sounds = {}
+        self.sheets = {}
+        # счётчики для отладки
+        self.disk_loads = 0
+        self.rotation_count = 0
+
+    def image(self, path, colorkey=None):
+        key = (normalize_path(path), colorkey)
+        image = self.images.get(key)
+        if image is None:
+            image = self.image_loader(key[0], colorkey)
+            self.disk_loads += 1
+            self.images[key] = image
+        return image
+
+    # изображение, повёрнутое на angle градусов (как pygame.transform.rotate)
+    def rotated(self, path, angle, colorkey=None):
+        angle %= 360
+        key = (normalize_path(path), colorkey, angle)
+        if angle in CARDINAL_ANGLES:
+            image = self.rotations.get(key)
+            if image is None:
+                image = self.rotate(key)
+                self.rotations[key] = image
+            return image
+        image = self.variants.get(key)
+        if image is not None:
+            self.variants.move_to_end(key)
+            return image
+        image = self.rotate(key)
+        self.variants[key] = image
+        if len(self.variants) > self.variant_limit:
+            self.variants.popitem(last=False)
+        return image
+
+    def rotate(self, key):
+        path, colorkey, angle = key
+        self.rotation_count += 1
+        return pygame.transform.rotate(self.image(path, colorkey), angle)
+
+    # лист поворотов для изображения, строится один раз для каждого набора параметров
+    def sheet(self, path, colorkey=None, directions=4, base_angle=270):
+        key = (normalize_path(path), colorkey, directions, base_angle)
+        sheet = self.sheets.get(key)
+        if sheet is None:
+            sheet = RotationSheet(self.image(path, colorkey), directions, base_angle)
+            self.rotation_count += directions
+            self.sheets[key] = sheet
+        return sheet
+
+    def sound(self, path):
+        path = normalize_path(path)
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = self.sound_loader(path)
+            self.disk_loads += 1
+            self.sounds[path] = sound
+        return sound
+
+    # предварительная загрузка, чтобы во время боя не обращаться к диску
+    # rotations - пары (путь, colorkey), для которых заранее строятся все четыре поворота
+    # sheets - пары (путь, colorkey), для которых строятся листы поворотов
+    def preload(self, images=(), rotations=(), sounds=(), sheets=()):
+        for path, colorkey in images:
+            self.image(path, colorkey)
+        for path, colorkey in sheets:
+            self.sheet(path, colorkey)
+        for path, colorkey in rotations:
+            for angle in CARDINAL_ANGLES:
+                self.rotated(path, angle, colorkey)
+        for path in sounds:
+            self.sound(path)
+
+    def clear(self):
+        self.images.clear()
+        self.rotations.clear()
+        self.variants.clear()
+        self.sounds.clear()
+        self.sheets.clear()
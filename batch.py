@@ -0,0 +1,63 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import headless
+import tanks
+
+
+# подготовка процесса-исполнителя: сетки уровней приходят уже разобранными из главного процесса
+def init_worker(grids):
+    tanks.level_grids.update(grids)
+    tanks.init_headless()
+
+
+# один бой в процессе-исполнителе
+# match - словарь с ключами level, seed, ai, bot и max_ticks (все необязательные)
+def play(match):
+    return headless.run_match(match.get("level", 1), match.get("seed"),
+                              max_ticks=match.get("max_ticks", headless.MAX_TICKS),
+                              ai=match.get("ai"), bot=match.get("bot"))
+
+
+# запуск независимых боёв на нескольких процессах
+# итоги возвращаются по мере завершения боёв, а не в порядке matches
+# workers - число процессов (по умолчанию - по числу ядер)
+def run_batch(matches, workers=None):
+    # каждая карта разбирается один раз здесь, а не в каждом исполнителе
+    filenames = {f"level{match.get('level', 1)}.tmx" for match in matches}
+    grids = {filename: tanks.level_grid(filename) for filename in filenames}
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(grids,)) as pool:
+        futures = [pool.submit(play, match) for match in matches]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный запуск боёв без окна на нескольких процессах")
+    parser.add_argument("--matches", type=int, default=8, help="количество боёв на каждом уровне")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2], choices=(1, 2))
+    parser.add_argument("--seed", type=int, default=0, help="seed первого боя, следующие получают seed + 1, ...")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=headless.MAX_TICKS)
+    parser.add_argument("--enemy-hp", type=int, default=tanks.ENEMY_PARAMS["hp"])
+    parser.add_argument("--enemy-damage", type=int, default=tanks.ENEMY_PARAMS["damage"])
+    parser.add_argument("--enemy-reload", type=int, default=tanks.ENEMY_PARAMS["reload_time"])
+    parser.add_argument("--waves", type=int, nargs="+", default=tanks.ENEMY_PARAMS["waves"],
+                        help="размеры волн врагов")
+    args = parser.parse_args()
+
+    ai = {"hp": args.enemy_hp, "damage": args.enemy_damage, "reload_time": args.enemy_reload, "waves": args.waves}
+    matches = [{"level": level, "seed": args.seed + i, "ai": ai, "max_ticks": args.max_ticks}
+               for level in args.levels for i in range(args.matches)]
+
+    started = time.perf_counter()
+    results = {"win": 0, "loss": 0, "timeout": 0}
+    for match in run_batch(matches, args.workers):
+        results[match["result"]] += 1
+        print(f"level {match['level']} seed {match['seed']}: {match['result']}, "
+              f"{match['game_time_ms'] / 1000:.1f} s of game time, player hp {match['player_hp']}, "
+              f"shots {match['shots_fired']}, damage dealt {match['damage_dealt']}", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"{len(matches)} matches in {elapsed:.1f} s ({len(matches) / elapsed:.2f} matches/s): "
+          f"{results['win']} won, {results['loss']} lost, {results['timeout']} timed out")
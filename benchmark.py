@@ -0,0 +1,249 @@
+import os
+
+# окно и звук не нужны, но отрисовка выполняется полностью (в поверхность без окна)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+import tanks
+from assets import NullSound
+from controls import Commands, ScriptedController
+from profiler import Profiler
+
+# базовые результаты зависят от машины, поэтому в репозиторий не входят:
+# перед изменением они записываются на своей машине (python benchmark.py --save-baseline),
+# а после изменения python benchmark.py сравнивает с ними новые замеры
+BASELINE = "benchmark_baseline.json"
+WARMUP_FRAMES = 60
+FRAMES = 600
+SEED = 12345
+TOLERANCE = 0.1  # допустимое ухудшение относительно базовых результатов (10%)
+
+# маршрут для сценариев с движением: едем вперёд, поворачиваем, снова едем
+PATROL = [Commands(forward=True)] * 90 + [Commands(turn=1)] + [Commands(forward=True)] * 90 + \
+    [Commands(turn=-1)] + [Commands(backward=True)] * 45 + [Commands(turn=1)]
+
+
+def patrol():
+    return ScriptedController(itertools.cycle(PATROL))
+
+
+# дополнительные вражеские танки в свободных местах карты, не ближе 300 пикселей к игроку
+def add_enemies(count):
+    sheet = tanks.assets.sheet(tanks.ENEMY_TANK_IMAGE, -1)
+    grid = tanks.battle_map.grid
+    cells = [(x, y) for y in range(1, grid.height - 3, 3) for x in range(1, grid.width - 3, 3)]
+    tanks.rng.shuffle(cells)
+    added = 0
+    for cx, cy in cells:
+        if added == count:
+            break
+        rect = pygame.Rect(cx * grid.tile_width, cy * grid.tile_height, 80, 80)
+        if grid.rect_hits_wall(rect):
+            continue
+        if abs(rect.centerx - tanks.player.rect.centerx) + abs(rect.centery - tanks.player.rect.centery) < 300:
+            continue
+        enemy = tanks.Enemy(sheet, rect.x, rect.y)
+        if tanks.walls_group.collideany(enemy) or len(tanks.enemies_group.collide(enemy)) > 1:
+            enemy.kill()
+            continue
+        added += 1
+
+
+def setup_idle():
+    return ScriptedController([])
+
+
+def setup_movement():
+    return patrol()
+
+
+def setup_enemies(count):
+    def setup():
+        add_enemies(count - len(tanks.enemies_group))
+        return patrol()
+    return setup
+
+
+# непрерывная стрельба: бесконечный боезапас, короткая перезарядка, игрок не погибает
+def setup_fire():
+    tanks.player.bullets = 10 ** 9
+    tanks.player.reload_time = 100
+    tanks.player.hp = 10 ** 9
+    add_enemies(9)
+    return ScriptedController(itertools.cycle([Commands(shoot=True)] * 120 + [Commands(turn=1)]))
+
+
+# сценарии с игровыми кадрами
+SCENARIOS = {
+    "idle": setup_idle,
+    "movement": setup_movement,
+    "enemies_1": setup_enemies(1),
+    "enemies_10": setup_enemies(10),
+    "enemies_50": setup_enemies(50),
+    "fire": setup_fire,
+}
+# сценарий загрузки и перезапуска уровня
+RESTART = "restart"
+
+
+# один кадр игры без ожидания: шаг логики, отрисовка, вывод
+def frame():
+    tanks.update_game()
+    tanks.draw_game()
+    tanks.count_frame()
+    with tanks.profiler.phase("flip"):
+        tanks.update_display()
+    tanks.profiler.end_frame()
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# частота кадров замеряется без профилировщика, время фаз (p50) и счётчики - отдельным проходом с ним
+def measure_frames(frames):
+    tanks.profiler.enabled = False
+    for _ in range(WARMUP_FRAMES):
+        frame()
+    started = time.perf_counter()
+    for _ in range(frames):
+        frame()
+    fps = frames / (time.perf_counter() - started)
+
+    profiler = tanks.profiler = Profiler(window=frames, enabled=True)
+    # первый кадр только запускает отсчёт времени
+    for _ in range(frames + 1):
+        frame()
+    summary = profiler.summary()
+    phases = {name: round(summary[name]["p50"], 4) for name in ["frame"] + list(profiler.phases)}
+    counters = {name: summary[name]["p50"] for name in profiler.counters_history()}
+    return {"fps": round(fps, 1), "phases": phases, "counters": counters}
+
+
+def measure_restart(level, repeats=5):
+    loads = []
+    for _ in range(repeats):
+        tanks.level_snapshot = None
+        started = time.perf_counter()
+        tanks.restart_game(level, SEED)
+        loads.append(time.perf_counter() - started)
+    restarts = []
+    for _ in range(repeats * 10):
+        started = time.perf_counter()
+        tanks.restart_game(level, SEED)
+        restarts.append(time.perf_counter() - started)
+    return {"load_ms": round(min(loads) * 1000, 3), "restart_ms": round(min(restarts) * 1000, 3)}
+
+
+# запуск одного сценария (в отдельном процессе, чтобы пиковая память относилась только к нему)
+def run_scenario(name, level, frames):
+    tanks.init_display(NullSound)
+    if name == RESTART:
+        result = measure_restart(level)
+    else:
+        tanks.restart_game(level, SEED)
+        tanks.controller = SCENARIOS[name]()
+        result = measure_frames(frames)
+    result["peak_mb"] = peak_memory_mb()
+    tanks.close_display()
+    return result
+
+
+# сравнение с базовыми результатами: частота кадров должна не упасть, время загрузки - не вырасти,
+# а счётчики работы за кадр (проверки столкновений, спрайты, снаряды...) - не вырасти:
+# они не зависят от скорости машины, поэтому их рост - это лишняя работа, даже если fps не упал
+def compare(result, base, tolerance):
+    notes = []
+    regressed = False
+    values = [(key, result.get(key), base.get(key), True) for key in ("fps",)] + \
+        [(key, result.get(key), base.get(key), False) for key in ("load_ms", "restart_ms")]
+    base_counters = base.get("counters", {})
+    values += [(name, value, base_counters.get(name), False) for name, value in result.get("counters", {}).items()]
+    for key, value, base_value, higher_is_better in values:
+        if value is None or base_value is None:
+            continue
+        if not base_value:
+            # счётчик, который раньше был нулевым
+            if value and not higher_is_better:
+                regressed = True
+                notes.append(f"{key} 0 -> {value:g} REGRESSION")
+            continue
+        change = (value - base_value) / base_value
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressed = True
+        if worse > tolerance or key in ("fps", "load_ms", "restart_ms"):
+            notes.append(f"{key} {change:+.0%}" + (" REGRESSION" if worse > tolerance else ""))
+    return ", ".join(notes), regressed
+
+
+def format_result(result):
+    if "fps" in result:
+        phases = sorted((item for item in result["phases"].items() if item[0] != "frame"),
+                        key=lambda item: -item[1])
+        top = ", ".join(f"{name} {value:.2f}" for name, value in phases[:4])
+        text = f"{result['fps']:7.1f} fps, frame p50 {result['phases']['frame']:.2f} ms ({top})"
+    else:
+        text = f"load {result['load_ms']:.2f} ms, in-place restart {result['restart_ms']:.3f} ms"
+    if result.get("peak_mb"):
+        text += f", peak {result['peak_mb']:.0f} MB"
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры производительности игры на типовых сценариях")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS) + [RESTART],
+                        choices=list(SCENARIOS) + [RESTART])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2], choices=(1, 2))
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как базовые")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    elif not args.save_baseline:
+        print(f"no baseline in {args.baseline}, run with --save-baseline first to compare against it")
+
+    results = {}
+    regressions = 0
+    context = multiprocessing.get_context("spawn")
+    for level in args.levels:
+        for name in args.scenarios:
+            key = f"level{level}/{name}"
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_scenario, name, level, args.frames).result()
+            results[key] = result
+            line = f"{key:<20}{format_result(result)}"
+            if key in baseline:
+                notes, regressed = compare(result, baseline[key], args.tolerance)
+                regressions += regressed
+                line += f"  [{notes}]"
+            print(line, flush=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{regressions} scenario(s) worse than the baseline by more than {args.tolerance:.0%}")
+        sys.exit(1)
@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+CHUNK_BUDGET_MB = 64  # сколько памяти могут занимать готовые фрагменты одного уровня
+PRELOAD_RADIUS = 1  # на сколько фрагментов вокруг окна камеры они готовятся заранее
+
+
+# кэш фрагментов статического слоя карты
+# фрагменты отрисовываются не при загрузке уровня, а по мере приближения камеры:
+# фоновый поток заранее готовит фрагменты вокруг окна камеры (ближние - первыми),
+# а давно не выводившиеся фрагменты удаляются, когда кэш превышает бюджет памяти.
+# фрагмент, который нужен прямо сейчас, но ещё не готов, отрисовывается сразу,
+# поэтому на экране никогда не бывает пустых мест.
+# фоновый поток не трогает окно: он рисует фрагмент на обычной поверхности, а в формат экрана
+# фрагмент преобразуется в главном потоке, когда его забирают (как в loader.py)
+class ChunkCache:
+    # bake(cx, cy) - отрисовка фрагмента без обращения к окну,
+    # finish(chunk) - преобразование готового фрагмента в главном потоке,
+    # chunk_bytes - память одного фрагмента
+    def __init__(self, bake, finish, chunk_bytes, budget_mb=CHUNK_BUDGET_MB, preload_radius=PRELOAD_RADIUS):
+        self.bake = bake
+        self.finish = finish
+        self.capacity = max(1, budget_mb * 1024 * 1024 // chunk_bytes)
+        self.preload_radius = preload_radius
+        self.chunks = OrderedDict()  # фрагменты от давно выводившихся к недавним
+        self.unfinished = set()  # фрагменты, подготовленные фоновым потоком и ещё не преобразованные
+        self.wanted = []  # фрагменты, которые фоновому потоку нужно подготовить, по порядку
+        self.keep = set()  # фрагменты вокруг камеры, они не удаляются
+        self.condition = threading.Condition()
+        self.thread = None
+        self.closed = False
+        self.baked = 0  # счётчики для профилировщика: отрисованные и удалённые фрагменты
+        self.evicted = 0
+
+    # готовый фрагмент (вызывается только из главного потока); если его ещё нет, он отрисовывается сразу
+    def get(self, key):
+        with self.condition:
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                self.chunks.move_to_end(key)
+                if key not in self.unfinished:
+                    return chunk
+                self.unfinished.discard(key)
+        if chunk is None:
+            chunk = self.bake(*key)
+            self.baked += 1
+        chunk = self.finish(chunk)
+        with self.condition:
+            self.chunks[key] = chunk
+            self.chunks.move_to_end(key)
+            # фоновый поток мог успеть подготовить тот же фрагмент
+            self.unfinished.discard(key)
+            self.evict()
+        return chunk
+
+    # окно камеры в номерах фрагментов (включительно); columns, rows - размер карты во фрагментах
+    # фоновому потоку передаются ещё не готовые фрагменты вокруг окна, начиная с ближайших
+    def view(self, first_cx, first_cy, last_cx, last_cy, columns, rows):
+        r = self.preload_radius
+        center_x, center_y = (first_cx + last_cx) / 2, (first_cy + last_cy) / 2
+        keys = [(cx, cy) for cy in range(max(0, first_cy - r), min(rows, last_cy + r + 1))
+                for cx in range(max(0, first_cx - r), min(columns, last_cx + r + 1))]
+        with self.condition:
+            self.keep = set(keys)
+            wanted = [key for key in keys if key not in self.chunks]
+            wanted.sort(key=lambda key: (key[0] - center_x) ** 2 + (key[1] - center_y) ** 2)
+            self.wanted = wanted
+            if wanted:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="chunk-baker", daemon=True)
+                    self.thread.start()
+                self.condition.notify()
+
+    # фоновый поток: отрисовка фрагментов из wanted
+    # новый вызов view заменяет список, поэтому фрагменты, от которых камера уже ушла, не готовятся
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.wanted and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                key = self.wanted.pop(0)
+                if key in self.chunks:
+                    continue
+            chunk = self.bake(*key)
+            with self.condition:
+                if self.closed:
+                    return
+                if key not in self.chunks:
+                    self.chunks[key] = chunk
+                    self.unfinished.add(key)
+                    self.baked += 1
+                    self.evict()
+
+    # удаление давно не выводившихся фрагментов сверх бюджета (вызывается под блокировкой)
+    def evict(self):
+        excess = len(self.chunks) - self.capacity
+        if excess <= 0:
+            return
+        for key in [key for key in self.chunks if key not in self.keep][:excess]:
+            del self.chunks[key]
+            self.unfinished.discard(key)
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # остановка фонового потока (кэш больше не нужен); ждёт, пока поток дорисует текущий фрагмент,
+    # поэтому после close можно завершать pygame
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.wanted = []
+            self.chunks.clear()
+            self.unfinished.clear()
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,173 @@
+from collections import namedtuple
+
+import pygame
+
+from pathfinding import FlowField
+
+# команды игрока на один шаг логики:
+# forward/backward - движение вперёд/назад, turn - поворот (-1 налево, 1 направо, 0 - нет), shoot - выстрел
+Commands = namedtuple("Commands", "forward backward turn shoot", defaults=(False, False, 0, False))
+IDLE = Commands()
+
+
+# управление с клавиатуры
+# удерживаемые клавиши (W/S) читаются в момент шага, а нажатия (A/D/пробел) запоминаются
+# из событий и выполняются на ближайшем шаге логики
+class KeyboardController:
+    def __init__(self):
+        self.turn = 0
+        self.shoot = False
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_d:
+                self.turn = 1
+            elif event.key == pygame.K_a:
+                self.turn = -1
+            if event.key == pygame.K_SPACE:
+                self.shoot = True
+
+    def get_commands(self):
+        keys = pygame.key.get_pressed()
+        commands = Commands(bool(keys[pygame.K_w]), bool(keys[pygame.K_s]), self.turn, self.shoot)
+        self.turn = 0
+        self.shoot = False
+        return commands
+
+
+# заранее записанная последовательность команд (по одной на шаг),
+# после её окончания игрок стоит на месте
+class ScriptedController:
+    def __init__(self, script):
+        self.script = iter(script)
+
+    def handle_event(self, event):
+        pass
+
+    def get_commands(self):
+        return next(self.script, IDLE)
+
+
+# простой бот, играющий за игрока: поворачивается к ближайшему живому врагу,
+# едет к нему и стреляет, когда враг на линии огня и его не закрывают стены;
+# к врагу за стенами и к бонусу с боеприпасами (когда снаряды кончаются) бот едет по полю путей
+# game - модуль игры (tanks), rng - генератор случайных чисел для выхода из тупиков
+class BotController:
+    def __init__(self, game, rng, fire_distance=500, stuck_ticks=30):
+        self.game = game
+        self.rng = rng
+        self.fire_distance = fire_distance
+        self.stuck_ticks = stuck_ticks
+        self.last_position = None
+        self.still = 0  # сколько шагов подряд танк пытался ехать, но не сдвинулся с места
+        self.moving = False  # была ли последняя команда командой движения
+        self.detour = 0  # сколько шагов ещё ехать в объезд, не поворачивая к врагу
+        self.turning = None  # угол танка перед последней командой поворота
+        self.field = None  # поле путей к текущей цели (pathfinding.FlowField)
+
+    def handle_event(self, event):
+        pass
+
+    def nearest_enemy(self, player):
+        enemies = [enemy for enemy in self.game.enemies_group if enemy.is_alive]
+        if not enemies:
+            return None
+        return min(enemies, key=lambda enemy: abs(enemy.rect.centerx - player.rect.centerx) +
+                   abs(enemy.rect.centery - player.rect.centery))
+
+    def get_commands(self):
+        commands = self.decide()
+        self.moving = commands.forward or commands.backward
+        return commands
+
+    def decide(self):
+        player = self.game.player
+        position = player.rect.center
+        # танк, который стоит и стреляет, не считается застрявшим
+        self.still = self.still + 1 if position == self.last_position and self.moving else 0
+        self.last_position = position
+        if self.still >= self.stuck_ticks:
+            # танк упёрся в препятствие - поворот в случайную сторону и объезд
+            self.still = 0
+            self.detour = self.stuck_ticks * 2
+            return Commands(turn=self.rng.choice((-1, 1)))
+        if self.detour:
+            self.detour -= 1
+            return Commands(forward=True)
+
+        if not player.get_bullets():
+            bonuses = [tile for tile in self.game.bonus_group.sprites() if tile.get_bonus_type() == "ammo"]
+            if not bonuses:
+                return Commands(forward=True)
+            bonus = min(bonuses, key=lambda tile: abs(tile.rect.centerx - player.rect.centerx) +
+                        abs(tile.rect.centery - player.rect.centery))
+            return self.head_to(player, bonus.rect.center)
+        target = self.nearest_enemy(player)
+        if target is None:
+            return Commands(forward=True)
+        dx = target.rect.centerx - player.rect.centerx
+        dy = target.rect.centery - player.rect.centery
+        angle = player.angle % 360
+        visible = self.game.visibility.can_see(player.rect, target.rect)
+        if visible and self.in_lane(player, angle, target) and self.clear_shot(player, target):
+            return Commands(shoot=True)
+        if not visible:
+            return self.head_to(player, target.rect.center)
+        # направление на врага по оси с большим смещением и поперёк неё
+        if abs(dx) >= abs(dy):
+            desired, side, distance = (0 if dx > 0 else 180), (90 if dy > 0 else 270), abs(dx)
+        else:
+            desired, side, distance = (90 if dy > 0 else 270), (0 if dx > 0 else 180), abs(dy)
+        if distance <= self.fire_distance and not self.in_lane(player, desired, target):
+            # враг рядом, но мимо линии огня: танк не едет на него в упор, а сдвигается вбок
+            desired = side
+        return self.drive(angle, desired)
+
+    # поворот в направлении desired, а если танк уже повёрнут - движение вперёд
+    def drive(self, angle, desired):
+        if angle != desired:
+            if self.turning == angle:
+                # повернуть не дала стена - танк отъезжает назад, чтобы освободить место
+                self.turning = None
+                return Commands(backward=True)
+            self.turning = angle
+            return Commands(turn=1 if (desired - angle) % 360 == 90 else -1)
+        self.turning = None
+        return Commands(forward=True)
+
+    # движение к точке по полю путей, как у вражеских танков
+    def head_to(self, player, point):
+        grid = self.game.battle_map.grid
+        if self.field is None or self.field.grid is not grid:
+            self.field = FlowField(grid)
+        self.field.set_target(grid.cell_at(*point))
+        x, y = grid.cell_at(*player.rect.center)
+        desired = self.field.direction(x, y)
+        angle = player.angle % 360
+        if desired is None:
+            # цель рядом (или пути нет) - прямо к ней по оси с большим смещением
+            dx = point[0] - player.rect.centerx
+            dy = point[1] - player.rect.centery
+            if abs(dx) >= abs(dy):
+                desired = 0 if dx > 0 else 180
+            else:
+                desired = 90 if dy > 0 else 270
+        elif desired in (0, 180):
+            # по пути танк держится середины клетки, чтобы не задевать углы стен
+            offset = int((y + 0.5) * grid.tile_height) - player.rect.centery
+            if abs(offset) >= player.player_speed:
+                desired = 90 if offset > 0 else 270
+        else:
+            offset = int((x + 0.5) * grid.tile_width) - player.rect.centerx
+            if abs(offset) >= player.player_speed:
+                desired = 0 if offset > 0 else 180
+        return self.drive(angle, desired)
+
+    # попадёт ли во врага снаряд танка, повёрнутого на angle
+    def in_lane(self, player, angle, target):
+        return self.game.shell_lane(player.rect, angle, self.fire_distance).colliderect(target.rect)
+
+    # не упрётся ли снаряд в стену на пути к врагу (проверяется часть полосы между танками)
+    def clear_shot(self, player, target):
+        lane = self.game.shell_lane(player.rect, player.angle % 360, self.fire_distance)
+        return not self.game.battle_map.grid.rect_hits_wall(lane.clip(player.rect.union(target.rect)))
@@ -0,0 +1,83 @@
+import pygame
+
+FULL_UPDATE_RATIO = 0.5  # если изменилось больше этой доли экрана, кадр выводится целиком
+
+
+# объединение пересекающихся прямоугольников, результат - непересекающиеся области
+def merge(rects):
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+# учёт изменившихся областей экрана между кадрами
+# пока камера стоит, перерисовываются и выводятся на экран только места, где подвижные объекты
+# были в прошлом кадре и находятся сейчас, а также прочие отмеченные изменения (интерфейс, клетки карты);
+# после прокрутки камеры, меню или перезапуска уровня кадр рисуется и выводится целиком
+class DirtyRects:
+    def __init__(self, size, full_ratio=FULL_UPDATE_RATIO):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.full_ratio = full_ratio
+        self.previous = []  # области, занятые объектами в прошлом кадре
+        self.current = []  # области, занятые объектами в этом кадре
+        self.changes = []  # прочие изменённые области этого кадра
+        self.updated = None  # области, которые нужно вывести на экран (None - весь экран)
+        self.scroll = None  # положение камеры в прошлом кадре
+        self.full = True
+
+    # следующий кадр будет нарисован и выведен целиком
+    def invalidate(self):
+        self.full = True
+
+    # начало кадра; при смене положения камеры кадр рисуется целиком
+    def begin(self, scroll):
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.full = True
+        self.current = []
+        self.changes = []
+
+    # область, которую объект занимает в этом кадре (в следующем кадре её нужно будет восстановить)
+    def add(self, rect):
+        if rect is None:
+            return
+        rect = self.screen_rect.clip(rect)
+        if rect.width and rect.height:
+            self.current.append(rect)
+            if self.updated is not None:
+                self.updated.append(rect)
+
+    # область, изменившаяся в этом кадре по другим причинам
+    def mark(self, rect):
+        rect = self.screen_rect.clip(rect)
+        if rect.width and rect.height:
+            self.changes.append(rect)
+
+    # области, которые нужно перерисовать в этом кадре, None - весь кадр
+    def regions(self):
+        if not self.full:
+            regions = merge(self.previous + self.current + self.changes)
+            if sum(rect.width * rect.height for rect in regions) <= \
+                    self.full_ratio * self.screen_rect.width * self.screen_rect.height:
+                self.updated = regions
+                return regions
+        self.updated = None
+        return None
+
+    # завершение кадра, возвращает области для pygame.display.update (None - нужен полный flip)
+    def end_frame(self):
+        updated = self.updated
+        self.previous = self.current
+        self.current = []
+        self.updated = None
+        self.full = False
+        return updated
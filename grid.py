@@ -0,0 +1,145 @@
+import math
+
+# типы клеток карты
+FLOOR = 0
+WALL = 1
+SPEED_BONUS = 2
+AMMO_BONUS = 3
+
+# номера тайлов пола и бонусов в tmx-файлах, все остальные тайлы считаются стенами
+FLOOR_TILES = (1, 66, 285)
+SPEED_TILES = (363, 106)
+AMMO_TILES = (364, 105)
+
+WALL_BYTE = bytes([WALL])
+
+
+# тип клетки по номеру тайла
+def tile_type(tile_id):
+    if tile_id in FLOOR_TILES:
+        return FLOOR
+    if tile_id in SPEED_TILES:
+        return SPEED_BONUS
+    if tile_id in AMMO_TILES:
+        return AMMO_BONUS
+    return WALL
+
+
+# сетка занятости карты: по одному байту на клетку, строки идут подряд
+# не зависит от pygame, поэтому годится и для инструментов без окна
+class OccupancyGrid:
+    def __init__(self, width, height, tile_width, tile_height, cells=None):
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.cells = bytearray(cells) if cells is not None else bytearray(width * height)
+        self.version = 0  # увеличивается при каждом изменении сетки
+
+    # построение сетки по слою tmx-карты (объекту pytmx.TiledMap)
+    @classmethod
+    def from_tmx(cls, tiled_map, layer=0):
+        grid = cls(tiled_map.width, tiled_map.height,
+                   tiled_map.tilewidth, tiled_map.tileheight)
+        gidmap = tiled_map.tiledgidmap
+        for y, row in enumerate(tiled_map.layers[layer].data):
+            offset = y * grid.width
+            for x, gid in enumerate(row):
+                grid.cells[offset + x] = tile_type(gidmap.get(gid, 0))
+        return grid
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    # тип клетки, за пределами карты - стена
+    def get(self, x, y):
+        if not self.in_bounds(x, y):
+            return WALL
+        return self.cells[y * self.width + x]
+
+    def set(self, x, y, value):
+        self.cells[y * self.width + x] = value
+        self.version += 1
+
+    def is_wall(self, x, y):
+        return self.get(x, y) == WALL
+
+    # клетка, в которой находится точка с мировыми координатами (px, py)
+    def cell_at(self, px, py):
+        return int(px // self.tile_width), int(py // self.tile_height)
+
+    # диапазон клеток (x0, y0, x1, y1), которые перекрывает прямоугольник
+    def cell_range(self, rect):
+        return (rect.left // self.tile_width, rect.top // self.tile_height,
+                (rect.right - 1) // self.tile_width, (rect.bottom - 1) // self.tile_height)
+
+    # пересекает ли прямоугольник (в мировых координатах) хотя бы одну стену
+    def rect_hits_wall(self, rect):
+        x0, y0, x1, y1 = self.cell_range(rect)
+        if x1 < x0 or y1 < y0:
+            return False
+        if x0 < 0 or y0 < 0 or x1 >= self.width or y1 >= self.height:
+            return True
+        # каждая строка проверяется одним поиском по срезу байтов
+        for y in range(y0, y1 + 1):
+            start = y * self.width
+            if self.cells.find(WALL_BYTE, start + x0, start + x1 + 1) != -1:
+                return True
+        return False
+
+    # проход луча от точки (x0, y0) до точки (x1, y1) (мировые координаты) по клеткам сетки (DDA)
+    # возвращает первую клетку-стену на пути или None, если путь свободен
+    def raycast(self, x0, y0, x1, y1):
+        tw, th = self.tile_width, self.tile_height
+        cx, cy = int(x0 // tw), int(y0 // th)
+        end_x, end_y = int(x1 // tw), int(y1 // th)
+        dx, dy = x1 - x0, y1 - y0
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # расстояние (в долях отрезка) до ближайших границ клеток и шаг между границами
+        if dx != 0:
+            border = (cx + (step_x > 0)) * tw
+            t_max_x = (border - x0) / dx
+            t_delta_x = tw / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy != 0:
+            border = (cy + (step_y > 0)) * th
+            t_max_y = (border - y0) / dy
+            t_delta_y = th / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+        cells = self.cells
+        width = self.width
+        # луч проходит не больше клеток, чем манхэттенское расстояние между концами
+        for _ in range(abs(end_x - cx) + abs(end_y - cy) + 1):
+            if not (0 <= cx < width and 0 <= cy < self.height) or cells[cy * width + cx] == WALL:
+                return cx, cy
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                cy += step_y
+                t_max_y += t_delta_y
+        return None
+
+    def line_of_sight(self, x0, y0, x1, y1):
+        return self.raycast(x0, y0, x1, y1) is None
+
+    # свободные клетки (пол) в радиусе radius клеток от клетки (cx, cy)
+    # окно вокруг клетки проверяется целиком операциями numpy над as_array, без цикла по клеткам
+    def free_cells(self, cx, cy, radius):
+        import numpy
+        x0, x1 = max(0, cx - radius), min(self.width, cx + radius + 1)
+        y0, y1 = max(0, cy - radius), min(self.height, cy + radius + 1)
+        if x0 >= x1 or y0 >= y1:
+            return []
+        ys, xs = numpy.mgrid[y0:y1, x0:x1]
+        free = (self.as_array()[y0:y1, x0:x1] == FLOOR) & \
+            ((xs - cx) ** 2 + (ys - cy) ** 2 <= radius * radius)
+        return list(zip(xs[free].tolist(), ys[free].tolist()))
+
+    # сетка в виде двумерного массива numpy (без копирования данных)
+    def as_array(self):
+        import numpy
+        return numpy.frombuffer(self.cells, dtype=numpy.uint8).reshape(self.height, self.width)
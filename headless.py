@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import time
+
+import tanks
+from controls import BotController
+from replay import REPLAY_DIR
+
+# ограничение длительности одного боя по умолчанию (шагов логики): 10 минут игрового времени
+MAX_TICKS = 10 * 60 * tanks.TICK_RATE
+
+
+# один бой без окна и звука
+# логика выполняется шаг за шагом без ожидания, поэтому бой идёт настолько быстро, насколько позволяет процессор
+# controller - источник команд игрока (по умолчанию - бот из controls.py),
+# ai - параметры вражеских танков (см. tanks.ENEMY_PARAMS), bot - параметры бота по умолчанию,
+# record - путь, по которому сохраняется запись боя (см. replay.py)
+# возвращает словарь с итогами боя
+def run_match(level=1, seed=None, controller=None, max_ticks=MAX_TICKS, ai=None, bot=None, record=None):
+    if not tanks.headless:
+        tanks.init_headless()
+    tanks.restart_game(level, seed, ai)
+    tanks.controller = controller or BotController(tanks, random.Random(seed), **(bot or {}))
+
+    started = time.perf_counter()
+    while tanks.game_result is None and tanks.game_clock.ticks < max_ticks:
+        tanks.update_game()
+    wall_time = time.perf_counter() - started
+    if record:
+        tanks.recorder.save(record, tanks.game_result)
+
+    if tanks.game_result is None:
+        result = "timeout"
+    else:
+        result = "win" if tanks.game_result else "loss"
+    return {"level": level, "seed": tanks.recorder.seed, "result": result,
+            "ticks": tanks.game_clock.ticks, "game_time_ms": tanks.game_clock.now(),
+            "player_hp": tanks.player.hp, "wall_time": wall_time, **tanks.stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бои без окна и звука с ботом вместо игрока")
+    parser.add_argument("--level", type=int, default=1, choices=(1, 2))
+    parser.add_argument("--seed", type=int, default=0, help="seed первого боя, следующие получают seed + 1, ...")
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--record", action="store_true", help=f"сохранять записи боёв в папку {REPLAY_DIR}")
+    args = parser.parse_args()
+
+    for i in range(args.matches):
+        seed = args.seed + i
+        record = os.path.join(REPLAY_DIR, f"headless_level{args.level}_seed{seed}.rpl") if args.record else None
+        match = run_match(args.level, seed, max_ticks=args.max_ticks, record=record)
+        print(f"level {match['level']} seed {match['seed']}: {match['result']}, "
+              f"{match['ticks']} ticks ({match['game_time_ms'] / 1000:.1f} s of game time) "
+              f"in {match['wall_time']:.2f} s, player hp {match['player_hp']}, "
+              f"shots {match['shots_fired']}, damage dealt {match['damage_dealt']}")
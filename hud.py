@@ -0,0 +1,81 @@
+import pygame
+
+TEXT_CACHE_LIMIT = 64  # сколько разных надписей хранится в кэше
+
+
+# кэш отрисованных надписей по тексту и цвету
+# font.render заметно дороже вывода готовой поверхности, а надписи меняются редко
+class TextCache:
+    def __init__(self, font, limit=TEXT_CACHE_LIMIT):
+        self.font = font
+        self.limit = limit
+        self.images = {}
+
+    def render(self, text, color):
+        key = (text, color)
+        image = self.images.get(key)
+        if image is None:
+            # надписи вроде секунд таймера не повторяются бесконечно, но кэш всё равно ограничен
+            if len(self.images) >= self.limit:
+                self.images.clear()
+            image = self.images[key] = self.font.render(text, True, color)
+        return image
+
+
+# интерфейс боя на отдельной прозрачной поверхности
+# каждый элемент (полоска, счётчик) хранит значение, с которым он нарисован, и перерисовывается
+# только когда значение меняется; изменённые области копятся в dirty (см. changes)
+class Hud:
+    def __init__(self, size, text_cache):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.text = text_cache
+        self.values = {}  # элемент -> значение, с которым он нарисован
+        self.rects = {}  # элемент -> занятая им область
+        self.dirty = []
+
+    # проверка значения элемента; если оно изменилось, прежняя область элемента очищается
+    def changed(self, name, value):
+        if name in self.values and self.values[name] == value:
+            return False
+        self.values[name] = value
+        rect = self.rects.pop(name, None)
+        if rect is not None:
+            self.surface.fill((0, 0, 0, 0), rect)
+            self.dirty.append(rect)
+        return True
+
+    def occupy(self, name, rect):
+        self.rects[name] = rect
+        self.dirty.append(rect)
+
+    # полоска с рамкой image, заполненная на fill пикселей
+    def bar(self, name, position, image, fill, color):
+        if not self.changed(name, fill):
+            return
+        x, y = position
+        rect = self.surface.blit(image, position)
+        if fill > 0:
+            pygame.draw.rect(self.surface, color, (x + 7, y + 7, fill, 26))
+        self.occupy(name, rect)
+
+    # значок и число рядом с ним; при value=None элемент скрыт
+    def counter(self, name, position, icon, value, color, text_offset=(74, 10)):
+        if not self.changed(name, value) or value is None:
+            return
+        x, y = position
+        rect = self.surface.blit(icon, position)
+        text = self.text.render(str(value), color)
+        rect = rect.union(self.surface.blit(text, (x + text_offset[0], y + text_offset[1])))
+        self.occupy(name, rect)
+
+    # области, изменённые с прошлого вызова (в координатах поверхности интерфейса)
+    def changes(self):
+        dirty = self.dirty
+        self.dirty = []
+        return dirty
+
+    # вывод интерфейса: выводятся только занятые элементами области, а не вся прозрачная поверхность
+    def draw(self, surface, position=(0, 0)):
+        x, y = position
+        for rect in self.rects.values():
+            surface.blit(self.surface, (x + rect.x, y + rect.y), rect)
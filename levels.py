@@ -0,0 +1,280 @@
+import json
+import mmap
+import os
+import struct
+import xml.etree.ElementTree as ElementTree
+
+import numpy
+import pygame
+import pytmx
+from pytmx.util_pygame import handle_transformation
+
+from grid import OccupancyGrid
+
+# скомпилированные уровни хранятся рядом с картами
+CACHE_DIR = os.path.join("maps", "cache")
+
+MAGIC = b"TANKLVL\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")  # сигнатура, версия формата, длина описания (json)
+ALIGNMENT = 16  # двоичные разделы файла начинаются с границы 16 байт
+
+LAYERS = 2  # слой 0 - карта, слой 1 - тайлы, которые открываются после сбора бонуса
+ATLAS_COLUMNS = 16
+
+
+# загрузчик изображений тайлов для pytmx, которому не нужно окно:
+# тайлы не преобразуются под формат экрана, это делается один раз для всего атласа
+def image_loader(filename, colorkey, **kwargs):
+    image = pygame.image.load(filename)
+
+    def load_tile(rect=None, flags=None):
+        tile = image.subsurface(rect) if rect else image
+        if flags:
+            tile = handle_transformation(tile, flags)
+        return tile.copy()
+
+    return load_tile
+
+
+# файлы, от которых зависит уровень: сам tmx, подключённые tsx и изображения тайлов
+def source_files(tmx_path, images):
+    folder = os.path.dirname(tmx_path)
+    tilesets = [os.path.join(folder, tileset.get("source"))
+                for tileset in ElementTree.parse(tmx_path).getroot().iter("tileset")
+                if tileset.get("source")]
+    return [tmx_path] + tilesets + sorted(set(images))
+
+
+# отпечаток файла: время изменения и размер
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def cache_path(tmx_path):
+    name = os.path.splitext(os.path.basename(tmx_path))[0]
+    return os.path.join(CACHE_DIR, f"{name}.bin")
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# компиляция tmx-файла: описание уровня и его двоичные разделы [(название, байты), ...]
+# разделы - номера тайлов обоих слоёв (индексы в атласе, 0 - пусто), сетка занятости
+# и атлас всех использованных тайлов в виде RGBA-пикселей
+def build_level(tmx_path):
+    tmx_path = os.path.normpath(tmx_path)
+    images = []
+
+    def recording_loader(filename, colorkey, **kwargs):
+        images.append(filename)
+        return image_loader(filename, colorkey, **kwargs)
+
+    tiled_map = pytmx.TiledMap(tmx_path, image_loader=recording_loader)
+    grid = OccupancyGrid.from_tmx(tiled_map)
+    width, height = tiled_map.width, tiled_map.height
+    tile_width, tile_height = tiled_map.tilewidth, tiled_map.tileheight
+
+    # атлас: каждый использованный тайл получает свой номер (с 1) и свою ячейку
+    tiles = numpy.zeros((LAYERS, height, width), dtype=numpy.uint16)
+    atlas_index = {}
+    atlas_tiles = []
+    for layer in range(LAYERS):
+        for y, row in enumerate(tiled_map.layers[layer].data):
+            for x, gid in enumerate(row):
+                if not gid:
+                    continue
+                if gid not in atlas_index:
+                    atlas_tiles.append(tiled_map.images[gid])
+                    atlas_index[gid] = len(atlas_tiles)
+                tiles[layer, y, x] = atlas_index[gid]
+
+    cell_width = max([tile.get_width() for tile in atlas_tiles] + [tile_width])
+    cell_height = max([tile.get_height() for tile in atlas_tiles] + [tile_height])
+    rows = max(1, -(-len(atlas_tiles) // ATLAS_COLUMNS))
+    atlas = pygame.Surface((ATLAS_COLUMNS * cell_width, rows * cell_height), pygame.SRCALPHA)
+    rects = []
+    for i, tile in enumerate(atlas_tiles):
+        x, y = i % ATLAS_COLUMNS * cell_width, i // ATLAS_COLUMNS * cell_height
+        atlas.blit(tile, (x, y))
+        rects.append([x, y, tile.get_width(), tile.get_height()])
+    pixels = pygame.image.tobytes(atlas, "RGBA")
+
+    sections = [("tiles", tiles.tobytes()), ("grid", bytes(grid.cells)), ("atlas", pixels)]
+    meta = {"sources": [[source, *file_stamp(source)] for source in source_files(tmx_path, images)],
+            "width": width, "height": height, "tile_width": tile_width, "tile_height": tile_height,
+            "atlas_size": list(atlas.get_size()), "atlas_rects": rects,
+            "sections": {}}
+    return meta, sections
+
+
+# запись скомпилированного уровня в двоичный файл
+def write_level(path, meta, sections):
+    # смещения разделов зависят от длины описания, поэтому оно собирается дважды
+    for _ in range(2):
+        encoded = json.dumps(meta).encode("utf-8")
+        offset = align(HEADER.size + len(encoded))
+        for name, data in sections:
+            meta["sections"][name] = [offset, len(data)]
+            offset = align(offset + len(data))
+    encoded = json.dumps(meta).encode("utf-8")
+
+    # запись во временный файл и замена, чтобы прерванная компиляция не оставила битый кэш
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+            file.write(encoded)
+            for name, data in sections:
+                file.seek(meta["sections"][name][0])
+                file.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# компиляция tmx-файла в двоичный файл уровня
+def compile_level(tmx_path, path=None):
+    path = path or cache_path(os.path.normpath(tmx_path))
+    write_level(path, *build_level(tmx_path))
+    return path
+
+
+# уровень из разделов в памяти (или срезов отображения файла, см. read_level)
+def make_level(meta, sections, mapping=None):
+    tiles = numpy.frombuffer(sections["tiles"], dtype=numpy.uint16).reshape(
+        LAYERS, meta["height"], meta["width"])
+    return Level(meta, tiles, sections["grid"], sections["atlas"], mapping)
+
+
+# скомпилированный уровень
+# mapping - отображение файла и его срезы, на которые ссылается уровень (None - данные в памяти)
+class Level:
+    def __init__(self, meta, tiles, cells, atlas_pixels, mapping=None):
+        self.sources = meta["sources"]
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.tile_width = meta["tile_width"]
+        self.tile_height = meta["tile_height"]
+        self.tiles = tiles  # массив (слой, y, x) индексов атласа
+        # исходная сетка занятости, при каждом запуске уровня используется её копия
+        self.grid = OccupancyGrid(self.width, self.height, self.tile_width, self.tile_height, cells)
+        self.atlas_size = tuple(meta["atlas_size"])
+        self.atlas_rects = meta["atlas_rects"]
+        self.atlas_pixels = atlas_pixels
+        self.images = None
+        self.mapping = mapping
+
+    # отказ от отображения файла: данные уровня копируются в память, а отображение закрывается,
+    # чтобы файл кэша можно было заменить (Windows не заменяет файл, пока он отображён в память);
+    # уровень после этого остаётся рабочим, им может пользоваться ещё не перезапущенный бой
+    def close(self):
+        if self.mapping is None:
+            return
+        data, views = self.mapping
+        self.mapping = None
+        self.tiles = self.tiles.copy()
+        self.atlas_pixels = bytes(self.atlas_pixels)
+        try:
+            for view in views:
+                view.release()
+            data.close()
+        except BufferError:
+            # на срезы ещё ссылается другой поток - отображение закроется, когда ссылки исчезнут
+            pass
+
+    # изменился ли хотя бы один из исходных файлов уровня
+    def is_stale(self):
+        try:
+            return any(file_stamp(source) != stamp for source, *stamp in self.sources)
+        except OSError:
+            return True
+
+    # изображения тайлов по индексу атласа (под индексом 0 - None)
+    # атлас преобразуется под формат экрана один раз, поэтому нужен созданный дисплей
+    def tile_images(self):
+        if self.images is None:
+            atlas = pygame.image.frombuffer(self.atlas_pixels, self.atlas_size, "RGBA").convert_alpha()
+            self.images = [None] + [atlas.subsurface(rect) for rect in self.atlas_rects]
+        return self.images
+
+    def tile_image(self, x, y, layer):
+        return self.tile_images()[self.tiles[layer, y, x]]
+
+
+# чтение скомпилированного уровня через отображение файла в память
+# номера тайлов и пиксели атласа не копируются: уровень ссылается прямо на отображение файла,
+# и страницы читаются с диска только при обращении к ним
+# возвращает None, если файл повреждён или записан другой версией формата
+def read_level(path):
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < HEADER.size:
+        data.close()
+        return None
+    magic, version, meta_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        data.close()
+        return None
+    meta = json.loads(data[HEADER.size:HEADER.size + meta_size].decode("utf-8"))
+    view = memoryview(data)
+    sections = {}
+    for name, (offset, size) in meta["sections"].items():
+        if offset + size > len(data):
+            for section in sections.values():
+                section.release()
+            view.release()
+            data.close()
+            return None
+        sections[name] = view[offset:offset + size]
+    # отображение живёт, пока жив уровень (на него ссылаются срезы) или пока не вызван Level.close
+    return make_level(meta, sections, (data, list(sections.values()) + [view]))
+
+
+# уровни, уже прочитанные этим процессом (по пути к tmx-файлу)
+loaded_levels = {}
+
+
+# загрузка уровня: из памяти, из кэша на диске или компиляцией tmx-файла,
+# если кэша нет или исходные файлы изменились после компиляции
+def load_level(tmx_path):
+    tmx_path = os.path.normpath(tmx_path)
+    level = loaded_levels.get(tmx_path)
+    if level is not None and not level.is_stale():
+        return level
+    path = cache_path(tmx_path)
+    level = None
+    if os.path.exists(path):
+        try:
+            level = read_level(path)
+        except (OSError, ValueError, KeyError):
+            level = None
+    if level is None or level.sources[0][0] != tmx_path or level.is_stale():
+        # прежние отображения файла кэша закрываются, иначе его нельзя заменить
+        for old in (level, loaded_levels.get(tmx_path)):
+            if old is not None:
+                old.close()
+        meta, sections = build_level(tmx_path)
+        try:
+            write_level(path, meta, sections)
+            level = read_level(path)
+        except (OSError, ValueError, KeyError):
+            level = None
+        if level is None:
+            # кэш записать не удалось (файл занят или диск недоступен) - уровень берётся из памяти
+            level = make_level(meta, dict(sections))
+    loaded_levels[tmx_path] = level
+    return level
+
+
+if __name__ == "__main__":
+    import sys
+
+    # предварительная компиляция уровней: python levels.py maps/level1.tmx maps/level2.tmx
+    for tmx_file in sys.argv[1:] or [os.path.join("maps", f"level{n}.tmx") for n in (1, 2)]:
+        print(f"{tmx_file} -> {compile_level(tmx_file)}")
@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pygame
+
+from assets import normalize_path
+from levels import load_level
+
+LOADER_WORKERS = 2
+
+
+# фоновая загрузка ресурсов
+# файлы изображений, звуков и уровней читаются и декодируются в потоках-исполнителях, пока главный
+# поток показывает меню; результат забирает главный поток при первом обращении к ресурсу.
+# преобразование изображений под формат экрана (convert) зависит от окна, поэтому потоки его не делают:
+# они возвращают исходные поверхности, а convert вызывается там, где изображение забирается (tanks.load_image)
+class Loader:
+    def __init__(self, sound_loader=pygame.mixer.Sound, workers=LOADER_WORKERS):
+        self.sound_loader = sound_loader
+        self.workers = workers
+        self.pool = None
+        self.tasks = {}  # ресурс -> future, пока результат не забран
+        self.total = 0  # сколько ресурсов поставлено в очередь за всё время (для progress)
+
+    def submit(self, key, function, *args):
+        if key in self.tasks:
+            return
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="loader")
+        self.tasks[key] = self.pool.submit(function, *args)
+        self.total += 1
+
+    # постановка ресурсов в очередь; ресурсы загружаются в порядке перечисления
+    # levels - пути к tmx-файлам (загружаются скомпилированные уровни, см. levels.load_level)
+    def preload(self, images=(), sounds=(), levels=()):
+        for path in images:
+            path = normalize_path(path)
+            self.submit(("image", path), pygame.image.load, path)
+        for path in sounds:
+            path = normalize_path(path)
+            self.submit(("sound", path), self.sound_loader, path)
+        for path in levels:
+            self.submit(("level", os.path.normpath(path)), load_level, path)
+
+    # результат фоновой загрузки (с ожиданием, если она ещё идёт) или загрузка прямо сейчас,
+    # если ресурс не ставился в очередь; ошибка загрузки в потоке возникает здесь, в главном потоке
+    def take(self, key, function, *args):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            return task.result()
+        return function(*args)
+
+    def image(self, path):
+        path = normalize_path(path)
+        return self.take(("image", path), pygame.image.load, path)
+
+    def sound(self, path):
+        path = normalize_path(path)
+        return self.take(("sound", path), self.sound_loader, path)
+
+    # уровень берётся через load_level и после фоновой загрузки: так проверяется,
+    # не изменились ли файлы уровня, а сам уровень уже лежит в памяти
+    def level(self, path):
+        self.take(("level", os.path.normpath(path)), load_level, path)
+        return load_level(path)
+
+    # доля готовых ресурсов от 0 до 1
+    def progress(self):
+        if not self.total:
+            return 1.0
+        pending = sum(not task.done() for task in self.tasks.values())
+        return (self.total - pending) / self.total
+
+    def done(self):
+        return all(task.done() for task in self.tasks.values())
+
+    # ожидание, пока не загрузится ещё хотя бы один ресурс, но не дольше timeout секунд
+    def wait(self, timeout):
+        pending = [task for task in self.tasks.values() if not task.done()]
+        if pending:
+            wait(pending, timeout, return_when=FIRST_COMPLETED)
@@ -0,0 +1,115 @@
+from collections import deque
+
+import numpy
+
+from grid import WALL
+
+CLEARANCE = 1  # сколько клеток вокруг центра танка должны быть свободны (танк 80x60 помещается в 3x3 клетки)
+UNREACHED = -1
+
+# шаги между соседними клетками и соответствующие им углы поворота танка
+DIRECTIONS = ((1, 0, 0), (0, 1, 90), (-1, 0, 180), (0, -1, 270))
+
+
+# общее для всех врагов поле путей к цели (клетке игрока)
+# проходимые клетки (те, где помещается танк) считаются один раз по сетке занятости,
+# а расстояния до цели - поиском в ширину от цели; поиск ленивый: он продолжается ровно до тех пор,
+# пока не дойдёт до клеток, о которых спрашивают танки, и заново начинается, только когда цель
+# переходит в другую клетку, поэтому каждый танк читает поле за O(1), а не ищет свой путь
+class FlowField:
+    def __init__(self, grid, obstacles=(), clearance=CLEARANCE):
+        self.grid = grid
+        # подвижные препятствия (например, подбитые танки), которых нет в сетке
+        self.obstacles = obstacles
+        self.clearance = clearance
+        self.passable = None  # по байту на клетку: 1 - танк помещается
+        self.grid_version = None
+        self.target = None
+        self.distance = []  # расстояние в шагах до цели для каждой клетки, UNREACHED - ещё не найдено
+        self.queue = deque()  # граница поиска в ширину
+        self.expanded = 0  # сколько клеток раскрыто поиском (для профилировщика)
+
+    # сброс, например когда на карте появилось новое препятствие
+    def invalidate(self):
+        self.passable = None
+        self.target = None
+
+    def build_passable(self):
+        grid = self.grid
+        blocked = grid.as_array() == WALL
+        for obstacle in self.obstacles:
+            x0, y0, x1, y1 = grid.cell_range(obstacle.rect)
+            blocked[max(0, y0):y1 + 1, max(0, x0):x1 + 1] = True
+        # клетка проходима, если в квадрате вокруг неё нет стен
+        r = self.clearance
+        padded = numpy.pad(blocked, r, constant_values=True)
+        area = numpy.zeros_like(blocked)
+        for dy in range(2 * r + 1):
+            for dx in range(2 * r + 1):
+                area |= padded[dy:dy + grid.height, dx:dx + grid.width]
+        self.passable = bytearray((~area).astype(numpy.uint8).tobytes())
+        self.grid_version = grid.version
+
+    # новая цель: поле строится заново, только если цель перешла в другую клетку
+    def set_target(self, cell):
+        if self.passable is None or self.grid.version != self.grid_version:
+            self.build_passable()
+            self.target = None
+        if cell == self.target or not self.grid.in_bounds(*cell):
+            return
+        self.target = cell
+        index = cell[1] * self.grid.width + cell[0]
+        self.distance = [UNREACHED] * len(self.passable)
+        self.distance[index] = 0
+        self.queue = deque([index])
+
+    # продолжение поиска в ширину, пока клетка index не получит расстояние
+    # (или пока не будет пройдена вся достижимая часть карты, при index=None - до конца)
+    def expand(self, index=None):
+        distance, passable, queue = self.distance, self.passable, self.queue
+        width = self.grid.width
+        size = len(distance)
+        expanded = 0
+        while queue and (index is None or distance[index] == UNREACHED):
+            current = queue.popleft()
+            expanded += 1
+            step = distance[current] + 1
+            x = current % width
+            for neighbour, valid in ((current - width, current >= width), (current + width, current + width < size),
+                                     (current - 1, x > 0), (current + 1, x < width - 1)):
+                if valid and distance[neighbour] == UNREACHED and passable[neighbour]:
+                    distance[neighbour] = step
+                    queue.append(neighbour)
+        self.expanded += expanded
+
+    # расстояние от клетки до цели в шагах, None - клетка непроходима или недостижима
+    def distance_at(self, x, y):
+        if self.target is None or not self.grid.in_bounds(x, y):
+            return None
+        index = y * self.grid.width + x
+        if self.distance[index] == UNREACHED and self.passable[index]:
+            self.expand(index)
+        result = self.distance[index]
+        return None if result == UNREACHED else result
+
+    # угол, в котором нужно ехать из клетки, чтобы приблизиться к цели
+    # None - пути нет или клетка уже рядом с целью
+    def direction(self, x, y):
+        own = self.distance_at(x, y)
+        best = None
+        for dx, dy, angle in DIRECTIONS:
+            distance = self.distance_at(x + dx, y + dy)
+            if distance is not None and (best is None or distance < best[0]):
+                best = (distance, angle)
+        if best is None or own is not None and best[0] >= own:
+            return None
+        return best[1]
+
+    # все клетки, из которых есть путь до цели (поле достраивается целиком)
+    def reachable_cells(self):
+        if self.target is None:
+            return []
+        self.expand()
+        width = self.grid.width
+        return [(index % width, index // width) for index, distance in enumerate(self.distance)
+                if distance != UNREACHED and self.passable[index]]
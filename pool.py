@@ -0,0 +1,42 @@
+# пул заранее созданных объектов (снарядов, вспышек выстрелов)
+# объекты берутся из пула при выстреле и возвращаются в него, когда анимация закончилась,
+# поэтому во время боя новые объекты почти не создаются
+class Pool:
+    def __init__(self, factory, capacity):
+        self.factory = factory
+        self.capacity = capacity
+        self.free = [factory() for _ in range(capacity)]
+        self.active = {}  # объекты, которые сейчас используются (словарь сохраняет порядок)
+        self.peak = 0  # наибольшее число одновременно занятых объектов
+        self.exhausted = 0  # сколько раз пул оказывался пуст и объект приходилось создавать
+
+    def acquire(self):
+        if self.free:
+            obj = self.free.pop()
+        else:
+            self.exhausted += 1
+            obj = self.factory()
+        self.active[obj] = None
+        self.peak = max(self.peak, len(self.active))
+        return obj
+
+    def release(self, obj):
+        if obj not in self.active:
+            return
+        del self.active[obj]
+        # объекты, созданные сверх вместимости, пулом не сохраняются
+        if len(self.free) < self.capacity:
+            self.free.append(obj)
+
+    # возврат всех занятых объектов, например, при перезапуске уровня
+    def release_all(self):
+        for obj in list(self.active):
+            obj.kill()
+            self.release(obj)
+
+    def in_use(self):
+        return len(self.active)
+
+    def stats(self):
+        return {"capacity": self.capacity, "in_use": len(self.active),
+                "free": len(self.free), "peak": self.peak, "exhausted": self.exhausted}
@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+
+import numpy
+import pygame
+
+# цвета фаз на графике (по порядку появления фаз)
+COLORS = [(230, 80, 80), (240, 160, 60), (230, 220, 80), (120, 220, 90), (70, 200, 200),
+          (80, 130, 240), (170, 100, 240), (240, 110, 200), (180, 180, 180), (140, 90, 60)]
+PERCENTILES = (50, 95, 99)
+FRAME_BUDGET = 1000 / 60  # миллисекунд на кадр при 60 кадрах в секунду
+MAX_TRACE = 100000  # ограничение длины записи (кадров)
+REFRESH_FRAMES = 15  # как часто перерисовывается панель профилировщика
+
+
+# замер одной фазы кадра, используется как контекстный менеджер:
+#     with profiler.phase("enemies"):
+#         enemies_group.update()
+# когда профилировщик выключен, замер сводится к двум проверкам флага
+class Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self.start = self.profiler.timer()
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            profiler = self.profiler
+            profiler.current[self.name] = profiler.current.get(self.name, 0.0) + profiler.timer() - self.start
+            self.start = None
+
+
+# профилировщик кадров: время каждой фазы за кадр, скользящие процентили,
+# счётчики (спрайты, проверки столкновений), график поверх игры и запись в CSV/JSON
+class Profiler:
+    def __init__(self, window=300, enabled=False, timer=time.perf_counter):
+        self.window = window  # сколько последних кадров учитывается в процентилях и на графике
+        self.enabled = enabled
+        self.timer = timer
+        self.phases = {}  # фаза -> Phase
+        self.current = {}  # время фаз в текущем кадре (секунды)
+        self.counters = {}  # счётчики текущего кадра
+        self.history = {}  # фаза или счётчик -> значения за последние кадры
+        self.frames = deque(maxlen=window)  # полное время кадров (миллисекунды)
+        self.trace = []  # все кадры с момента включения (для записи в файл)
+        self.frame_start = None
+        self.font = None
+        self.panel = None  # готовая панель для вывода поверх игры
+        self.panel_age = 0
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(self, name)
+        return phase
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # включение/выключение, после включения статистика собирается заново
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    def reset(self):
+        self.current.clear()
+        self.counters.clear()
+        self.history.clear()
+        self.frames.clear()
+        self.trace.clear()
+        self.frame_start = None
+        self.panel = None
+
+    # завершение кадра: замеры кадра переносятся в историю
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = self.timer()
+        if self.frame_start is not None:
+            row = {"frame": (now - self.frame_start) * 1000}
+            self.frames.append(row["frame"])
+            for name in self.phases:
+                row[name] = self.current.get(name, 0.0) * 1000
+            row.update(self.counters)
+            for name, value in row.items():
+                if name not in self.history:
+                    self.history[name] = deque(maxlen=self.window)
+                self.history[name].append(value)
+            if len(self.trace) < MAX_TRACE:
+                self.trace.append(row)
+        self.frame_start = now
+        self.current.clear()
+        self.counters.clear()
+
+    # процентили значения фазы или счётчика за последние кадры
+    def percentiles(self, name):
+        values = self.history.get(name)
+        if not values:
+            return tuple(0.0 for _ in PERCENTILES)
+        return tuple(numpy.percentile(values, PERCENTILES))
+
+    # сводка: для каждой фазы и счётчика - процентили за последние кадры
+    def summary(self):
+        return {name: dict(zip((f"p{p}" for p in PERCENTILES), self.percentiles(name)))
+                for name in self.history}
+
+    # запись всех кадров в файл, формат выбирается по расширению (.csv или .json)
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        columns = []
+        for row in self.trace:
+            columns.extend(name for name in row if name not in columns)
+        with open(path, "w", newline="") as file:
+            if path.endswith(".json"):
+                json.dump({"summary": self.summary(), "frames": self.trace}, file)
+            else:
+                writer = csv.DictWriter(file, columns, restval=0)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        return path
+
+    # вывод таблицы процентилей и графика времени кадров поверх игры, возвращает занятую область
+    # панель перерисовывается раз в REFRESH_FRAMES кадров, чтобы сам профилировщик не тормозил игру
+    def draw(self, surface, position=(10, 200)):
+        if not self.enabled:
+            return
+        if self.panel is None or self.panel_age >= REFRESH_FRAMES:
+            self.panel = self.render_panel()
+            self.panel_age = 0
+        self.panel_age += 1
+        return surface.blit(self.panel, position)
+
+    def render_panel(self):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 22)
+        x = y = 0
+        names = list(self.phases)
+        white = (255, 255, 255)
+        # строки таблицы: название, значения, цвет
+        rows = [("phase (ms)", [f"p{p}" for p in PERCENTILES], white),
+                ("frame", [f"{value:.2f}" for value in self.percentiles("frame")], white)]
+        for i, name in enumerate(names):
+            rows.append((name, [f"{value:.2f}" for value in self.percentiles(name)], COLORS[i % len(COLORS)]))
+        for name in self.counters_history():
+            rows.append((name, [f"{value:.0f}" for value in self.percentiles(name)], white))
+        width = 360
+        height = len(rows) * 18 + 90
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, (name, values, color) in enumerate(rows):
+            top = y + 4 + i * 18
+            surface.blit(self.font.render(name, True, color), (x + 6, top))
+            # значения выравниваются по правому краю своих колонок
+            for j, value in enumerate(values):
+                text = self.font.render(value, True, color)
+                surface.blit(text, text.get_rect(topright=(x + 210 + j * 60, top)))
+
+        # график: столбик на кадр, разбитый по цветам фаз, линия - бюджет кадра при 60 FPS
+        graph_top = y + len(rows) * 18 + 10
+        graph_height = 70
+        scale = graph_height / (FRAME_BUDGET * 2)
+        frames = len(self.frames)
+        bar_width = max(1, (width - 12) // self.window)
+        for i in range(frames):
+            bottom = graph_top + graph_height
+            column = x + 6 + i * bar_width
+            for j, name in enumerate(names):
+                values = self.history.get(name, ())
+                # фаза могла появиться позже остальных, её история выравнивается по последнему кадру
+                k = i - (frames - len(values))
+                if k < 0:
+                    continue
+                bar = min(int(values[k] * scale), bottom - graph_top)
+                if bar > 0:
+                    pygame.draw.rect(surface, COLORS[j % len(COLORS)], (column, bottom - bar, bar_width, bar))
+                    bottom -= bar
+        budget_y = graph_top + graph_height - int(FRAME_BUDGET * scale)
+        pygame.draw.line(surface, white, (x + 6, budget_y), (x + width - 6, budget_y))
+        return surface
+
+    def counters_history(self):
+        return [name for name in self.history if name != "frame" and name not in self.phases]
@@ -0,0 +1,186 @@
+import numpy
+
+from grid import WALL
+
+# состояния снаряда
+FREE = 0  # ячейка свободна
+FLYING = 1  # снаряд летит
+EXPLODING = 2  # проигрывается анимация взрыва
+
+EXPLOSION_FRAMES = 8  # количество кадров анимации взрыва
+
+# массивы, в которых хранится состояние снарядов
+ARRAYS = ("x", "y", "w", "h", "dx", "dy", "damage", "owner", "angle", "state", "frame")
+
+
+# пакетная симуляция снарядов
+# состояние всех снарядов хранится в массивах numpy, и за один шаг все снаряды
+# сдвигаются и проверяются на попадание в стены и танки векторными операциями, без цикла по снарядам
+class ProjectileEngine:
+    def __init__(self, grid, capacity=256, max_step=None):
+        self.grid = grid
+        # наибольшее смещение снаряда за одну проверку столкновений (по умолчанию - размер клетки)
+        self.max_step = max_step or min(grid.tile_width, grid.tile_height)
+        self.walls = grid.as_array()  # массив numpy поверх байтов сетки, обновляется вместе с ней
+        self.capacity = 0
+        self.x = numpy.zeros(0, dtype=numpy.int32)  # левый верхний угол снаряда, во время взрыва - центр
+        self.y = numpy.zeros(0, dtype=numpy.int32)
+        self.w = numpy.zeros(0, dtype=numpy.int32)  # размеры прямоугольника снаряда
+        self.h = numpy.zeros(0, dtype=numpy.int32)
+        self.dx = numpy.zeros(0, dtype=numpy.int32)  # скорость (пикселей за шаг)
+        self.dy = numpy.zeros(0, dtype=numpy.int32)
+        self.damage = numpy.zeros(0, dtype=numpy.int32)
+        self.owner = numpy.zeros(0, dtype=numpy.int8)  # команда танка, который выстрелил
+        self.angle = numpy.zeros(0, dtype=numpy.int16)  # угол для выбора изображения
+        self.state = numpy.zeros(0, dtype=numpy.uint8)
+        self.frame = numpy.zeros(0, dtype=numpy.int8)  # текущий кадр взрыва
+        self.grow(capacity)
+        # счётчики
+        self.fired = 0
+        self.detonations = 0
+        self.exhausted = 0  # сколько раз массивы пришлось увеличивать
+
+    # увеличение всех массивов до new_capacity элементов
+    def grow(self, new_capacity):
+        for name in ARRAYS:
+            old = getattr(self, name)
+            new = numpy.zeros(new_capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.capacity = new_capacity
+
+    # выпуск снаряда, возвращает его номер
+    def spawn(self, x, y, w, h, dx, dy, damage, owner, angle):
+        free = numpy.flatnonzero(self.state == FREE)
+        if len(free) == 0:
+            self.exhausted += 1
+            index = self.capacity
+            self.grow(self.capacity * 2)
+        else:
+            index = free[0]
+        self.x[index], self.y[index] = x, y
+        self.w[index], self.h[index] = w, h
+        self.dx[index], self.dy[index] = dx, dy
+        self.damage[index] = damage
+        self.owner[index] = owner
+        self.angle[index] = angle
+        self.state[index] = FLYING
+        self.frame[index] = 0
+        self.fired += 1
+        return index
+
+    def clear(self):
+        self.state[:] = FREE
+
+    # копия состояния всех снарядов (например, для ключевых кадров повтора)
+    def save_state(self):
+        return {name: getattr(self, name).copy() for name in ARRAYS}
+
+    def load_state(self, state):
+        for name in ARRAYS:
+            setattr(self, name, state[name].copy())
+        self.capacity = len(self.state)
+
+    def active_count(self):
+        return int(numpy.count_nonzero(self.state != FREE))
+
+    # попадает ли каждый из снарядов (номера indices) хотя бы одним углом в клетку-стену
+    # снаряд не больше клетки, поэтому его прямоугольник перекрывает не больше 2x2 клеток
+    def hits_walls(self, indices):
+        tw, th = self.grid.tile_width, self.grid.tile_height
+        height, width = self.walls.shape
+        left = self.x[indices] // tw
+        top = self.y[indices] // th
+        right = (self.x[indices] + self.w[indices] - 1) // tw
+        bottom = (self.y[indices] + self.h[indices] - 1) // th
+        outside = (left < 0) | (top < 0) | (right >= width) | (bottom >= height)
+        left, right = numpy.clip(left, 0, width - 1), numpy.clip(right, 0, width - 1)
+        top, bottom = numpy.clip(top, 0, height - 1), numpy.clip(bottom, 0, height - 1)
+        walls = self.walls
+        return outside | (walls[top, left] == WALL) | (walls[top, right] == WALL) | \
+            (walls[bottom, left] == WALL) | (walls[bottom, right] == WALL)
+
+    # проверка снарядов (номера indices) на столкновение со стенами и танками
+    # возвращает маску взорвавшихся снарядов и список попаданий (номер танка, урон)
+    def collide(self, indices, tank_rects, tank_teams, tank_alive):
+        detonated = self.hits_walls(indices)
+        hits = []
+        if len(tank_rects):
+            bx, by = self.x[indices, None], self.y[indices, None]
+            bw, bh = self.w[indices, None], self.h[indices, None]
+            tx, ty, tw, th = tank_rects[:, 0], tank_rects[:, 1], tank_rects[:, 2], tank_rects[:, 3]
+            # матрица пересечений (снаряд x танк)
+            overlap = (bx < tx + tw) & (tx < bx + bw) & (by < ty + th) & (ty < by + bh)
+            enemy = tank_teams[None, :] != self.owner[indices, None]
+            overlap &= enemy | ~tank_alive[None, :]
+            detonated |= overlap.any(axis=1)
+            damaged = overlap & enemy & tank_alive[None, :]
+            for bullet, tank in zip(*numpy.nonzero(damaged)):
+                hits.append((int(tank), int(self.damage[indices[bullet]])))
+        return detonated, hits
+
+    # один шаг симуляции
+    # tank_rects - массив (N, 4) прямоугольников танков (x, y, w, h),
+    # tank_teams - команды танков, tank_alive - живы ли танки
+    # снаряд взрывается о любой танк чужой команды и о любой подбитый танк,
+    # урон получают только живые танки чужой команды
+    # возвращает список попаданий (номер танка, урон) и количество взрывов на этом шаге
+    def step(self, tank_rects, tank_teams, tank_alive):
+        # анимация взрывов, начавшихся на прошлых шагах
+        exploding = numpy.flatnonzero(self.state == EXPLODING)
+        finished = exploding[self.frame[exploding] == EXPLOSION_FRAMES - 1]
+        self.state[finished] = FREE
+        self.frame[exploding] += 1
+
+        flying = numpy.flatnonzero(self.state == FLYING)
+        if len(flying) == 0:
+            return [], 0
+        # быстрые снаряды двигаются подшагами не длиннее max_step пикселей,
+        # чтобы не пролетать сквозь стены и танки
+        dx, dy = self.dx[flying], self.dy[flying]
+        speed = int(max(numpy.abs(dx).max(), numpy.abs(dy).max()))
+        substeps = max(1, -(-speed // self.max_step))
+        hits = []
+        exploded = []
+        for k in range(substeps):
+            self.x[flying] += dx * (k + 1) // substeps - dx * k // substeps
+            self.y[flying] += dy * (k + 1) // substeps - dy * k // substeps
+            detonated, substep_hits = self.collide(flying, tank_rects, tank_teams, tank_alive)
+            hits.extend(substep_hits)
+            exploded.append(flying[detonated])
+            dx, dy, flying = dx[~detonated], dy[~detonated], flying[~detonated]
+            if len(flying) == 0:
+                break
+
+        exploded = numpy.concatenate(exploded)
+        # взрыв рисуется с центром в центре снаряда
+        self.x[exploded] += self.w[exploded] // 2
+        self.y[exploded] += self.h[exploded] // 2
+        self.state[exploded] = EXPLODING
+        self.frame[exploded] = 0
+        self.detonations += len(exploded)
+        return hits, len(exploded)
+
+    # изображения видимых снарядов и взрывов и их прямоугольники на экране
+    # shell_images - изображения снаряда по углу, explosion_images - кадры взрыва по углу
+    # view - область карты, в которой нужны снаряды (по умолчанию окно камеры)
+    def placements(self, camera, shell_images, explosion_images, view=None):
+        active = numpy.flatnonzero(self.state != FREE)
+        if len(active) == 0:
+            return []
+        view = view or camera.get_view()
+        # грубое отсечение: взрыв может выходить за свой центр на половину кадра
+        margin = 256
+        visible = active[(self.x[active] > view.left - margin) & (self.x[active] < view.right + margin) &
+                         (self.y[active] > view.top - margin) & (self.y[active] < view.bottom + margin)]
+        placements = []
+        for index in visible:
+            angle = int(self.angle[index]) % 360
+            x, y = camera.world_to_screen(int(self.x[index]), int(self.y[index]))
+            if self.state[index] == FLYING:
+                image = shell_images[angle]
+                placements.append((image, image.get_rect(topleft=(x, y))))
+            else:
+                image = explosion_images[angle][self.frame[index]]
+                placements.append((image, image.get_rect(center=(x, y))))
+        return placements
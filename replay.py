@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import struct
+
+import pygame
+
+from controls import Commands, IDLE
+
+# повторы боёв: начальное значение генератора случайных чисел и команды игрока на каждом шаге логики
+# бой полностью детерминирован, поэтому по этим данным он воспроизводится точь-в-точь
+
+REPLAY_DIR = "replays"
+
+MAGIC = b"TNKR"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHI")  # сигнатура, версия формата, длина описания (json)
+
+KEYFRAME_INTERVAL = 300  # шагов логики между ключевыми кадрами при воспроизведении (5 секунд)
+SEEK_TICKS = 600  # перемотка стрелками влево/вправо (10 секунд)
+SPEEDS = (1, 2, 4, 8, 16)  # скорости воспроизведения
+
+# биты команды в байте
+FORWARD = 1
+BACKWARD = 2
+TURN_RIGHT = 4
+TURN_LEFT = 8
+SHOOT = 16
+
+
+def encode_commands(commands):
+    code = FORWARD * commands.forward | BACKWARD * commands.backward | SHOOT * commands.shoot
+    if commands.turn > 0:
+        code |= TURN_RIGHT
+    elif commands.turn < 0:
+        code |= TURN_LEFT
+    return code
+
+
+def decode_commands(code):
+    turn = 1 if code & TURN_RIGHT else -1 if code & TURN_LEFT else 0
+    return Commands(bool(code & FORWARD), bool(code & BACKWARD), turn, bool(code & SHOOT))
+
+
+# запись целого числа переменной длины (по 7 бит в байте)
+def write_varint(output, value):
+    while value >= 0x80:
+        output.append(value & 0x7F | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+# запись команд игрока во время боя
+# команды хранятся сериями одинаковых байтов (байт команды, длина серии), поэтому
+# минута боя обычно занимает несколько сотен байт
+class ReplayRecorder:
+    def __init__(self, level, seed, ai=None):
+        self.level = level
+        self.seed = seed
+        self.ai = ai or {}
+        self.codes = bytearray()
+
+    def record(self, commands):
+        self.codes.append(encode_commands(commands))
+
+    def save(self, path, result=None):
+        stream = bytearray()
+        position = 0
+        while position < len(self.codes):
+            code = self.codes[position]
+            run = position + 1
+            while run < len(self.codes) and self.codes[run] == code:
+                run += 1
+            stream.append(code)
+            write_varint(stream, run - position)
+            position = run
+        meta = json.dumps({"level": self.level, "seed": self.seed, "ai": self.ai,
+                           "ticks": len(self.codes), "result": result}).encode("utf-8")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)))
+            file.write(meta)
+            file.write(stream)
+        return path
+
+
+# загруженный повтор
+class Replay:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, meta_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path}: not a replay file of version {FORMAT_VERSION}")
+        meta = json.loads(data[HEADER.size:HEADER.size + meta_size].decode("utf-8"))
+        self.level = meta["level"]
+        self.seed = meta["seed"]
+        self.ai = meta["ai"]
+        self.result = meta["result"]  # итог, записанный вместе с повтором (True, False или None)
+        self.commands = []
+        position = HEADER.size + meta_size
+        while position < len(data):
+            commands = decode_commands(data[position])
+            run, position = read_varint(data, position + 1)
+            self.commands.extend([commands] * run)
+        self.ticks = len(self.commands)
+
+
+# источник команд игрока, воспроизводящий повтор
+# команда выбирается по номеру шага игровых часов, поэтому после перемотки
+# (восстановления ключевого кадра) воспроизведение продолжается с нужного места
+class ReplayController:
+    def __init__(self, game, replay):
+        self.game = game
+        self.replay = replay
+
+    def handle_event(self, event):
+        pass
+
+    def get_commands(self):
+        tick = self.game.game_clock.ticks
+        return self.replay.commands[tick] if tick < self.replay.ticks else IDLE
+
+
+# воспроизведение повтора с ключевыми кадрами для перемотки
+# game - модуль игры (tanks), уже подготовленный к запуску боёв (окно или init_headless)
+class ReplayPlayer:
+    def __init__(self, game, replay, keyframe_interval=KEYFRAME_INTERVAL):
+        self.game = game
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = {}  # номер шага -> состояние боя
+        game.restart_game(replay.level, replay.seed, replay.ai)
+        game.controller = ReplayController(game, replay)
+
+    @property
+    def tick(self):
+        return self.game.game_clock.ticks
+
+    def finished(self):
+        return self.game.game_result is not None or self.tick >= self.replay.ticks
+
+    # один шаг логики
+    def step(self):
+        if self.tick % self.keyframe_interval == 0 and self.tick not in self.keyframes:
+            self.keyframes[self.tick] = self.game.save_state()
+        self.game.update_game()
+
+    # перемотка на шаг tick: назад - через ближайший более ранний ключевой кадр,
+    # вперёд - просто выполнением шагов логики без отрисовки
+    def seek(self, tick):
+        tick = max(0, min(tick, self.replay.ticks))
+        if tick < self.tick:
+            start = max(key for key in self.keyframes if key <= tick)
+            self.game.load_state(self.keyframes[start])
+        while self.tick < tick and not self.finished():
+            self.step()
+
+    # воспроизведение до конца без отрисовки, возвращает итог боя
+    def run(self):
+        while not self.finished():
+            self.step()
+        return self.game.game_result
+
+
+# воспроизведение в окне
+# вправо/влево - перемотка, вверх/вниз - скорость, пробел - пауза
+def play(path):
+    import tanks
+
+    replay = Replay(path)
+    tanks.init_display()
+    player = ReplayPlayer(tanks, replay)
+    speed = 0
+    paused = False
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                    tanks.timestep.reset()
+                elif event.key == pygame.K_UP:
+                    speed = min(speed + 1, len(SPEEDS) - 1)
+                elif event.key == pygame.K_DOWN:
+                    speed = max(speed - 1, 0)
+                elif event.key == pygame.K_RIGHT:
+                    player.seek(player.tick + SEEK_TICKS)
+                elif event.key == pygame.K_LEFT:
+                    player.seek(player.tick - SEEK_TICKS)
+
+        ticks = tanks.timestep.advance()
+        if not paused:
+            for _ in range(ticks * SPEEDS[speed]):
+                if player.finished():
+                    break
+                player.step()
+
+        tanks.draw_game()
+        status = f"{player.tick / tanks.TICK_RATE:.0f} / {replay.ticks / tanks.TICK_RATE:.0f} s  x{SPEEDS[speed]}"
+        if paused:
+            status += "  pause"
+        text = tanks.text_cache.render(status, (255, 255, 255))
+        # надпись выводится поверх кадра, её место восстанавливается в следующем кадре
+        tanks.dirty.add(tanks.screen.blit(text, (20, tanks.HEIGHT - 60)))
+        tanks.clock.tick(tanks.FPS)
+        tanks.update_display()
+    tanks.close_display()
+
+
+# воспроизведение без окна: проверка, что повтор приводит к тому же итогу, что и при записи
+def verify(path):
+    import tanks
+
+    replay = Replay(path)
+    tanks.init_headless()
+    result = ReplayPlayer(tanks, replay).run()
+    return result == replay.result, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного боя")
+    parser.add_argument("path")
+    parser.add_argument("--headless", action="store_true", help="воспроизвести без окна и сверить итог с записью")
+    args = parser.parse_args()
+    if args.headless:
+        same, result = verify(args.path)
+        print(f"result {result}: {'matches the recording' if same else 'DIFFERS from the recording'}")
+    else:
+        play(args.path)
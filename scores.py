@@ -0,0 +1,96 @@
+import datetime
+import json
+import os
+import sqlite3
+
+# рекорды и история боёв
+# каждый законченный бой добавляется строкой в базу SQLite (модуль sqlite3 из стандартной библиотеки):
+# запись идёт в транзакции, поэтому прерванная игра не оставляет файл наполовину записанным,
+# а индекс по уровню и времени позволяет выбирать лучшие результаты, не читая всю историю.
+# лучшие результаты каждого уровня держатся в памяти, и таблица рекордов выводится без обращения к диску
+
+RECORDS_DB = os.path.join("records", "records.db")
+LEGACY_RECORDS = os.path.join("records", "records.txt")  # прежний текстовый формат: карта;дата;время
+TOP_SIZE = 6  # сколько лучших результатов показывается
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    level INTEGER NOT NULL,
+    played TEXT NOT NULL,
+    seconds INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    stats TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_best ON matches (won, level, seconds);
+CREATE INDEX IF NOT EXISTS matches_level ON matches (level);
+"""
+
+
+class RecordStore:
+    # level_names - номер уровня -> название (для переноса старого records.txt)
+    def __init__(self, path=RECORDS_DB, level_names=None, top_size=TOP_SIZE, legacy_path=LEGACY_RECORDS):
+        self.top_size = top_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        created = not os.path.exists(path)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        if created and legacy_path and os.path.exists(legacy_path):
+            self.import_legacy(legacy_path, level_names or {})
+        self.top = {}  # уровень -> [(время, дата), ...] по возрастанию времени
+        self.load_top()
+
+    # перенос рекордов из records.txt при первом создании базы
+    def import_legacy(self, path, level_names):
+        levels = {name: level for level, name in level_names.items()}
+        rows = []
+        with open(path, encoding="utf8") as file:
+            for line in file:
+                parts = line.strip().split(";")
+                if len(parts) != 3 or parts[0] not in levels:
+                    continue
+                played = datetime.datetime.strptime(parts[1], "%m/%d/%Y").date().isoformat()
+                rows.append((levels[parts[0]], played, int(parts[2]), 1, "{}"))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO matches (level, played, seconds, won, stats) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def load_top(self):
+        self.top = {}
+        levels = self.connection.execute("SELECT DISTINCT level FROM matches WHERE won = 1").fetchall()
+        for (level,) in levels:
+            self.top[level] = self.connection.execute(
+                "SELECT seconds, played FROM matches WHERE won = 1 AND level = ? ORDER BY seconds, id LIMIT ?",
+                (level, self.top_size)).fetchall()
+
+    # запись законченного боя; stats - счётчики боя (выстрелы, урон и т.д.)
+    def add(self, level, seconds, won, stats=None, played=None):
+        played = played or datetime.date.today().isoformat()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO matches (level, played, seconds, won, stats) VALUES (?, ?, ?, ?, ?)",
+                (level, played, seconds, int(won), json.dumps(stats or {})))
+        if won:
+            top = self.top.setdefault(level, [])
+            top.append((seconds, played))
+            # сортировка устойчивая: при равном времени выше остаётся более ранний рекорд, как и в load_top
+            top.sort(key=lambda record: record[0])
+            del top[self.top_size:]
+
+    # лучшие результаты: [(уровень, время, дата), ...] одного уровня или всех вместе
+    def best(self, level=None):
+        levels = [level] if level is not None else sorted(self.top)
+        records = [(level, seconds, played) for level in levels for seconds, played in self.top.get(level, [])]
+        records.sort(key=lambda record: record[1])
+        return records[:self.top_size]
+
+    # история боёв уровня, начиная с последних: [(дата, время, победа, счётчики), ...]
+    def history(self, level, limit=100):
+        rows = self.connection.execute(
+            "SELECT played, seconds, won, stats FROM matches WHERE level = ? ORDER BY id DESC LIMIT ?",
+            (level, limit))
+        return [(played, seconds, bool(won), json.loads(stats)) for played, seconds, won, stats in rows]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,51 @@
+import pygame
+
+from spatial import update_sprite
+
+# атрибуты, которые есть у любого спрайта (членство в группах), в снимок не входят
+SPRITE_ATTRIBUTES = set(vars(pygame.sprite.Sprite()))
+
+
+# изменяемые значения копируются, остальные (числа, строки, изображения) хранятся по ссылке
+def copy_value(value):
+    if isinstance(value, (pygame.Rect, list, dict, set)):
+        return value.copy()
+    return value
+
+
+# состояние спрайта: все его собственные атрибуты
+def capture(sprite):
+    return {name: copy_value(value) for name, value in vars(sprite).items()
+            if name not in SPRITE_ATTRIBUTES}
+
+
+# снимок состояния уровня сразу после загрузки
+# key - то, от чего зависит снимок (например, номер уровня и параметры врагов),
+# sprites - спрайты, которые меняются во время боя (их состояние и группы восстанавливаются),
+# groups - группы, из которых при восстановлении удаляются спрайты, появившиеся после снимка,
+# values - прочие значения (точки спавна, счётчики)
+class LevelSnapshot:
+    def __init__(self, key, grid, sprites, groups, values):
+        self.key = key
+        self.cells = bytes(grid.cells)
+        self.sprites = {sprite: (capture(sprite), tuple(sprite.groups())) for sprite in sprites}
+        self.groups = groups
+        self.values = {name: copy_value(value) for name, value in values.items()}
+
+    # восстановление уровня на месте, возвращает сохранённые значения
+    def restore(self, grid):
+        for group in self.groups:
+            for sprite in group.sprites():
+                if sprite not in self.sprites:
+                    sprite.kill()
+        for sprite, (state, groups) in self.sprites.items():
+            for name, value in state.items():
+                setattr(sprite, name, copy_value(value))
+            current = sprite.groups()
+            sprite.remove(*[group for group in current if group not in groups])
+            sprite.add(*[group for group in groups if group not in current])
+            # прямоугольник мог измениться, пространственный индекс групп обновляется
+            update_sprite(sprite)
+        grid.cells[:] = self.cells
+        grid.version += 1
+        return {name: copy_value(value) for name, value in self.values.items()}
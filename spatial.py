@@ -0,0 +1,98 @@
+import pygame
+
+
+# группа спрайтов с пространственным индексом (равномерной хеш-сеткой)
+# каждый спрайт записывается в те ячейки сетки, которые перекрывает его прямоугольник,
+# поэтому проверка столкновения просматривает только ячейки под проверяемым прямоугольником,
+# а не всю группу целиком
+class SpatialGroup(pygame.sprite.Group):
+    def __init__(self, cell_width, cell_height, *sprites):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = {}  # (x, y) ячейки -> спрайты, которые её перекрывают
+        self.sprite_cells = {}  # спрайт -> диапазон ячеек, в которые он записан
+        self.queries = 0  # количество проверок столкновений (для профилировщика)
+        super().__init__(*sprites)
+
+    # диапазон ячеек (x0, y0, x1, y1), которые перекрывает прямоугольник
+    def cell_range(self, rect):
+        return (rect.left // self.cell_width, rect.top // self.cell_height,
+                (rect.right - 1) // self.cell_width, (rect.bottom - 1) // self.cell_height)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.insert(sprite, self.cell_range(sprite.rect))
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.erase(sprite)
+
+    def insert(self, sprite, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                # словарь вместо множества сохраняет порядок добавления спрайтов
+                self.cells.setdefault((x, y), {})[sprite] = None
+        self.sprite_cells[sprite] = cell_range
+
+    def erase(self, sprite):
+        cell_range = self.sprite_cells.pop(sprite, None)
+        if cell_range is None:
+            return
+        x0, y0, x1, y1 = cell_range
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                cell = self.cells.get((x, y))
+                if cell is not None:
+                    cell.pop(sprite, None)
+                    if not cell:
+                        del self.cells[(x, y)]
+
+    # перезапись спрайта в индексе после изменения его прямоугольника
+    def refresh(self, sprite):
+        cell_range = self.cell_range(sprite.rect)
+        if self.sprite_cells.get(sprite) != cell_range:
+            self.erase(sprite)
+            self.insert(sprite, cell_range)
+
+    # спрайты из ячеек, которые перекрывает прямоугольник (без повторов)
+    def candidates(self, rect):
+        x0, y0, x1, y1 = self.cell_range(rect)
+        found = {}
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    found.update(cell)
+        return found
+
+    # аналог pygame.sprite.spritecollideany: первый спрайт группы, с которым сталкивается sprite
+    def collideany(self, sprite):
+        self.queries += 1
+        rect = sprite.rect
+        x0, y0, x1, y1 = self.cell_range(rect)
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    for other in cell:
+                        if rect.colliderect(other.rect):
+                            return other
+        return None
+
+    # аналог pygame.sprite.spritecollide(sprite, group, False)
+    def collide(self, sprite):
+        self.queries += 1
+        rect = sprite.rect
+        return [other for other in self.candidates(rect) if rect.colliderect(other.rect)]
+
+    # есть ли в ячейке (x, y) хотя бы один спрайт группы
+    def is_occupied(self, x, y):
+        return (x, y) in self.cells
+
+
+# обновление индекса во всех пространственных группах, в которых состоит спрайт
+def update_sprite(sprite):
+    for group in sprite.groups():
+        if isinstance(group, SpatialGroup):
+            group.refresh(sprite)
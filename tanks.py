@@ -1,22 +1,127 @@
 import pygame
-import pytmx
 import math
+import os
 import sys
 import random
 import datetime
-
-FPS = 60
+import functools
+import numpy
+
+from ai import AIScheduler
+from chunks import ChunkCache
+from assets import AssetManager, NullSound, CARDINAL_ANGLES
+from controls import KeyboardController
+from dirty import DirtyRects
+from grid import OccupancyGrid, FLOOR, SPEED_BONUS, AMMO_BONUS
+from hud import Hud, TextCache
+from levels import load_level
+from loader import Loader
+from pathfinding import FlowField
+from pool import Pool
+from profiler import Profiler
+from projectiles import ProjectileEngine
+from replay import ReplayRecorder, REPLAY_DIR
+from scores import RecordStore
+from snapshot import LevelSnapshot
+from spatial import SpatialGroup, update_sprite
+from timestep import GameClock, FixedTimestep
+from visibility import Visibility
+from waves import SpawnIndex
+
+FPS = 60  # ограничение частоты отрисовки
+TICK_RATE = 60  # количество шагов игровой логики в секунду
+MAX_TICKS_PER_FRAME = 5  # сколько шагов логики можно выполнить за один кадр, догоняя отставание
+MENU_WAIT = 250  # меню ждут событий не дольше этого времени (мс), а не крутят цикл вхолостую
+HUD_SIZE = (320, 280)  # область экрана, занятая интерфейсом боя
 WIDTH, HEIGHT = 1280, 720
 tile_width = tile_height = 32
-
-# точки спавна для уровней
-SPAWNPOINTS_FOR_LEVELS = [[(22, 48), (22, 22), (70, 40), (22, 48), (70, 22), (60, 60)],
-                          [(22, 50), (75, 25), (22, 48), (30, 77), (22, 22), (70, 75)]]
+CHUNK_SIZE = 16  # размер фрагмента статического слоя карты (в клетках)
+
+headless = False  # режим без окна и звука (см. init_headless)
+rng = random.Random()  # генератор случайных чисел игры, задаётся при перезапуске (restart_game)
+controller = None  # источник команд игрока (см. controls.py)
+level_snapshot = None  # снимок загруженного уровня для быстрого перезапуска (см. restart_game)
+profiler = Profiler()  # замеры фаз кадра, включается клавишей F3
+ai_scheduler = AIScheduler()  # распределение решений вражеских танков по шагам логики
+dirty = DirtyRects((WIDTH, HEIGHT))  # изменившиеся области экрана (см. draw_game)
+loader = Loader()  # фоновая загрузка ресурсов (см. init_display)
+battle_ready = False  # подготовлены ли ресурсы боя (см. prepare_battle)
+
+PROFILE_DIR = "profiles"  # папка для записей профилировщика
+
+LEVEL_NAMES = {1: "Таможня", 2: "Пустыня"}
+
+DETOUR_TIME = 1500  # сколько враг объезжает препятствие наугад, если путь к игроку загорожен (мс)
+# планы движения вражеского танка между решениями: стоять, ехать к игроку по полю путей,
+# выходить на линию огня рядом с игроком, ехать наугад
+HOLD = "hold"
+FOLLOW_PATH = "follow_path"
+ALIGN = "align"
+WANDER = "wander"
+STANDOFF_DISTANCE = 400  # ближе этого расстояния враг, видящий игрока, не едет к нему, а выходит на линию огня
+FIRE_RANGE = 500  # дальность, на которой танки проверяют линию огня
+
+# параметры вражеских танков по умолчанию (для отдельного боя их можно изменить через restart_game)
+# waves - размеры волн: следующая волна появляется, когда уничтожена предыдущая
+ENEMY_PARAMS = {"speed": 2, "hp": 75, "damage": 10, "reload_time": 2500, "waves": [1, 1, 1, 1, 1]}
+
+# клетки, в которых игрок начинает уровень
+# враги появляются в случайных свободных клетках (см. waves.SpawnIndex)
+PLAYER_SPAWNS = [(22, 48), (22, 50)]
+
+# команды танков (снаряды не наносят урон танкам своей команды)
+PLAYER_TEAM = 0
+ENEMY_TEAM = 1
+
+# смещение снаряда относительно танка и его скорость (dx, dy) для каждого направления выстрела
+BULLET_LAUNCH = {0: (14, -22, 0, -30), 90: (35, 15, 30, 0),
+                 180: (14, 35, 0, 30), 270: (-20, 13, -30, 0)}
+
+
+# ресурсы, которые загружаются заранее, чтобы во время боя не обращаться к диску
+SHOT_SPRITES = "sprites/animated_shot"
+FLASH_FRAMES = [f"{SHOT_SPRITES}/Flash_A_0{i}.png" for i in range(1, 6)]
+EXPLOSION_FRAMES = [f"{SHOT_SPRITES}/Explosion_{i}.png" for i in range(1, 9)]
+SHELL_IMAGE = f"{SHOT_SPRITES}/Heavy_Shell.png"
+PLAYER_TANK_IMAGE = "textures/tanks/player tank.png"
+ENEMY_TANK_IMAGE = "textures/tanks/enemy tank.png"
+KILLED_TANK_IMAGE = "textures/tanks/killed tank.png"
+BATTLE_SOUNDS = ["sounds/shot.wav", "sounds/engine_sound.wav", "sounds/movement.wav",
+                 "sounds/explosion.wav", "sounds/btn_pressed.wav"]
+INTERFACE_IMAGES = ["interface/bar.png", "interface/Bullet.png", "interface/Bonus_Icon.png"]
+MENU_IMAGES = ["menu/background.png", "menu/start button.png", "menu/levels button.png",
+               "menu/records_btn.png", "menu/controls button.png", "menu/exit button.png",
+               "menu/records_backgorund.png", "menu/level1.PNG", "menu/level2.PNG", "menu/panel.png",
+               "menu/controls wndw.png"]
+
+LOADING_FRAME = 1 / 30  # как часто перерисовывается экран загрузки (секунды)
+
+
+# сетки уровней, уже прочитанные из скомпилированных файлов (по имени файла)
+# пакетный запуск (batch.py) передаёт их процессам-исполнителям, чтобы те не читали карты заново
+level_grids = {}
+
+
+# сетка занятости уровня без загрузки изображений тайлов
+def level_grid(filename):
+    if filename not in level_grids:
+        level_grids[filename] = load_level(f"maps/{filename}").grid
+    return level_grids[filename]
+
+
+# клетки появления врагов по номеру уровня: (исходная сетка уровня, клетки)
+# поиск клеток обходит всю карту, поэтому он повторяется, только если уровень перечитан
+# (файлы уровня изменились, см. level_changed) и исходная сетка стала другой
+spawn_cells = {}
 
 
 # функция загрузки изображения
+# файл мог быть уже прочитан в фоне (см. loader.py), здесь изображение только преобразуется
 def load_image(fullname, colorkey=None):
-    image = pygame.image.load(fullname)
+    image = loader.image(fullname)
+    if headless:
+        # без окна преобразовать формат изображения нельзя, да и незачем
+        return image
     if colorkey is not None:
         # загрузка изображения без фона
         # если параметр colorkey равен -1,
@@ -33,29 +138,143 @@ def load_image(fullname, colorkey=None):
 # класс игровой карты
 class Map:
     def __init__(self, filename):
-        # загрузка карты с использованием библиотеки pytmx
-        self.map = pytmx.load_pygame(f"maps/{filename}")
-        self.height = self.map.height
-        self.width = self.map.width
-        self.tile_size = self.map.tilewidth
+        self.filename = filename
+        if headless:
+            # без окна изображения тайлов не нужны, достаточно заранее прочитанной сетки
+            self.level = None
+            parsed = level_grid(filename)
+        else:
+            # уровень читается из скомпилированного файла (levels.py), tmx разбирается, только если он изменился
+            # обычно уровень уже прочитан в фоне, пока было открыто меню
+            self.level = loader.level(f"maps/{filename}")
+            parsed = self.level.grid
+        self.source = parsed  # исходная сетка уровня, общая для всех запусков
+        # сетка занятости: тип каждой клетки (пол, стена, бонус) по первому (нулевому) слою карты
+        # бонусы меняют сетку во время боя, поэтому у каждого запуска уровня своя копия
+        self.grid = OccupancyGrid(parsed.width, parsed.height,
+                                  parsed.tile_width, parsed.tile_height, parsed.cells)
+        self.height = self.grid.height
+        self.width = self.grid.width
+        self.tile_size = self.grid.tile_width
+        self.layer = None
+
+    # изображение тайла (без окна изображений нет)
+    def tile_image(self, x, y, layer):
+        if self.level is None:
+            return None
+        return self.level.tile_image(x, y, layer)
 
     # рендеринг карты
     def render(self):
-        for y in range(self.height):
-            for x in range(self.width):
-                # создание клетки
-                # в качетсве её изображения берется изображение тайла с первого (нулевого) слоя карты
-                tile_id = self.map.tiledgidmap[self.map.get_tile_gid(x, y, 0)]
-                if tile_id == 1 or tile_id == 66 or tile_id == 285:
-                    Tile(tiles_group, self.map.get_tile_image(x, y, 0), x, y)
-                elif tile_id == 363 or tile_id == 106:
-                    Tile(bonus_group, self.map.get_tile_image(x, y, 0), x, y,
-                         "speed")
-                elif tile_id == 364 or tile_id == 105:
-                    Tile(bonus_group, self.map.get_tile_image(x, y, 0), x, y,
-                         "ammo")
-                else:
-                    Tile(walls_group, self.map.get_tile_image(x, y, 0), x, y)
+        # все клетки заранее отрисовываются на статический слой,
+        # спрайты создаются только для стен и бонусов, с которыми нужно проверять столкновения
+        if not headless:
+            self.layer = MapLayer(self)
+        cells = self.grid.as_array()
+        for y, x in numpy.argwhere(cells != FLOOR).tolist():
+            cell = cells[y, x]
+            if cell == SPEED_BONUS:
+                Tile(bonus_group, self.tile_image(x, y, 0), x, y,
+                     "speed")
+            elif cell == AMMO_BONUS:
+                Tile(bonus_group, self.tile_image(x, y, 0), x, y,
+                     "ammo")
+            else:
+                Tile(walls_group, self.tile_image(x, y, 0), x, y)
+
+
+# кэши фрагментов статического слоя по имени файла уровня: (уровень, кэш)
+baked_chunks = {}
+
+
+# отрисовка фрагмента (cx, cy) размером CHUNK_SIZE x CHUNK_SIZE клеток
+# вызывается и из фонового потока кэша, поэтому не обращается к окну: фрагмент рисуется
+# на обычной 32-битной поверхности и преобразуется под формат экрана в главном потоке (см. ChunkCache)
+def bake_chunk(level, cx, cy):
+    chunk = pygame.Surface((CHUNK_SIZE * tile_width, CHUNK_SIZE * tile_height), 0, 32)
+    chunk.fill((0, 0, 0))
+    for y in range(cy * CHUNK_SIZE, min((cy + 1) * CHUNK_SIZE, level.height)):
+        for x in range(cx * CHUNK_SIZE, min((cx + 1) * CHUNK_SIZE, level.width)):
+            image = level.tile_image(x, y, 0)
+            if image is not None:
+                chunk.blit(image, ((x - cx * CHUNK_SIZE) * tile_width,
+                                   (y - cy * CHUNK_SIZE) * tile_height))
+    return chunk
+
+
+# класс статического слоя карты
+# клетки карты отрисовываются на поверхности-фрагменты размером CHUNK_SIZE x CHUNK_SIZE клеток,
+# а каждый кадр на экран выводятся только фрагменты, попадающие в окно камеры;
+# фрагменты готовятся по мере движения камеры и удаляются, когда далеко от неё (см. chunks.py),
+# поэтому загрузка и память не зависят от размера карты
+class MapLayer:
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.chunk_width = CHUNK_SIZE * tile_width
+        self.chunk_height = CHUNK_SIZE * tile_height
+        self.columns = (game_map.width + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.rows = (game_map.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        # кэш фрагментов общий для всех перезапусков уровня,
+        # фрагмент копируется, только когда его нужно изменить (см. set_tile)
+        level, chunks = baked_chunks.get(game_map.filename, (None, None))
+        if level is not game_map.level:
+            if chunks is not None:
+                chunks.close()
+            # атлас преобразуется под формат экрана здесь, а не в фоновом потоке
+            game_map.level.tile_images()
+            # фрагменты в формате экрана - 4 байта на пиксель
+            chunks = ChunkCache(functools.partial(bake_chunk, game_map.level), pygame.Surface.convert,
+                                self.chunk_width * self.chunk_height * 4)
+            baked_chunks[game_map.filename] = (game_map.level, chunks)
+        self.shared_chunks = chunks
+        self.own_chunks = {}  # фрагменты, изменённые этим слоем (их не удаляет кэш)
+        self.changed = []  # изменённые клетки (прямоугольники на карте), их нужно вывести на экран
+
+    # возврат к исходному виду слоя (например, после сбора бонусов)
+    def reset(self):
+        self.own_chunks.clear()
+
+    def chunk(self, key):
+        chunk = self.own_chunks.get(key)
+        if chunk is None:
+            chunk = self.shared_chunks.get(key)
+        return chunk
+
+    # замена изображения клетки (x, y) прямо на готовом фрагменте
+    def set_tile(self, x, y, image):
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        if key not in self.own_chunks:
+            self.own_chunks[key] = self.shared_chunks.get(key).copy()
+        chunk = self.own_chunks[key]
+        rect = pygame.Rect((x % CHUNK_SIZE) * tile_width, (y % CHUNK_SIZE) * tile_height,
+                           tile_width, tile_height)
+        chunk.fill((0, 0, 0), rect)
+        if image is not None:
+            chunk.blit(image, rect)
+        self.changed.append(pygame.Rect(x * tile_width, y * tile_height, tile_width, tile_height))
+
+    # номера первого и последнего фрагментов, попадающих в часть экрана area
+    def chunk_range(self, camera, area):
+        offset_x, offset_y = camera.world_to_screen(0, 0)
+        return (max(0, (area.left - offset_x) // self.chunk_width),
+                max(0, (area.top - offset_y) // self.chunk_height),
+                min(self.columns - 1, (area.right - 1 - offset_x) // self.chunk_width),
+                min(self.rows - 1, (area.bottom - 1 - offset_y) // self.chunk_height))
+
+    # сообщение кэшу, какая часть карты сейчас на экране, чтобы он готовил фрагменты вокруг неё
+    def view(self, camera, screen_rect):
+        self.shared_chunks.view(*self.chunk_range(camera, screen_rect), self.columns, self.rows)
+
+    # вывод видимой части слоя в окно камеры
+    # area - часть экрана, которую нужно заполнить (по умолчанию весь экран)
+    def draw(self, surface, camera, area=None):
+        area = area or surface.get_rect()
+        offset_x, offset_y = camera.world_to_screen(0, 0)
+        first_cx, first_cy, last_cx, last_cy = self.chunk_range(camera, area)
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                surface.blit(self.chunk((cx, cy)), (offset_x + cx * self.chunk_width,
+                                                    offset_y + cy * self.chunk_height))
 
 
 # класс тайла(клеточки)
@@ -64,19 +283,23 @@ class Tile(pygame.sprite.Sprite):
     # её изображение, координаты клетки на игровом поле и необязательный параметр bonus_type,
     # который указывет, к какому типу бонусов относится клетка
     def __init__(self, group, image, pos_x, pos_y, bonus_type=None):
-        super().__init__(group, all_sprites)
         self.image = image
         self.coords = (pos_x, pos_y)
         self.bonus_type = bonus_type
-        self.rect = self.image.get_rect().move(tile_width * pos_x,
-                                               tile_height * pos_y)
+        self.rect = pygame.Rect(tile_width * pos_x, tile_height * pos_y,
+                                tile_width, tile_height)
+        # прямоугольник задаётся до добавления в группы, так как по нему строится пространственный индекс
+        super().__init__(group)
 
     def get_map_coords(self):
         return self.coords
 
     def remove_image(self):
         # смена изображения клетки на изображение тайла с теми же координатами, но со второго слоя
-        self.image = battle_map.map.get_tile_image(*self.coords, 1)
+        self.image = battle_map.tile_image(*self.coords, 1)
+        if battle_map.layer is not None:
+            battle_map.layer.set_tile(*self.coords, self.image)
+        battle_map.grid.set(*self.coords, FLOOR)
         self.remove(bonus_group)
         self.add(tiles_group)
 
@@ -85,11 +308,13 @@ class Tile(pygame.sprite.Sprite):
 
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, image, pos_x, pos_y):
-        super().__init__(player_group, all_sprites)
-        self.image = image
-        self.rect = self.image.get_rect().move(pos_x, pos_y)  # координаты экранные
+    # для инициализации необходимо передать лист поворотов танка (assets.RotationSheet)
+    def __init__(self, sheet, pos_x, pos_y):
         self.angle = -90  # угол, на который повёрнут танк (в градусах)
+        self.sheet = sheet
+        self.image = sheet.frame(self.angle)
+        self.rect = self.image.get_rect().move(pos_x, pos_y)  # координаты мировые
+        super().__init__(player_group, all_sprites)
         self.player_speed = 5  # скорость танка
         self.hp = 100  # очки здоровья
         self.max_speed = 7  # максимальаня скорость, которую может иметь танк,
@@ -108,68 +333,70 @@ class Player(pygame.sprite.Sprite):
                                    math.cos(math.radians(self.angle)),
                                    speed *
                                    math.sin(math.radians(self.angle)))
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, enemies_group):
+        update_sprite(self)
+        if walls_group.collideany(self) or \
+                enemies_group.collideany(self):
             self.rect = self.rect.move(-speed *
                                        math.cos(math.radians(self.angle)),
                                        -speed *
                                        math.sin(math.radians(self.angle)))
+            update_sprite(self)
 
     def update_bonus_timer(self):
         # проверка того, что действие ускорения ещё не кончилось
-        if (pygame.time.get_ticks() - self.bonus_timer >= self.speed_bonus_time) \
+        if (game_clock.now() - self.bonus_timer >= self.speed_bonus_time) \
                 and self.speed_bonus_time != 0:
             self.bonus_timer = 0
             self.speed_bonus_time = 0
             self.player_speed = 5
 
-    def movement(self):
+    def movement(self, commands):
         self.update_bonus_timer()
 
-        #  проверка того, какие клавишы нажаты пользователем
-        #  и перемещение танка в зависимости от этого
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]:
+        #  перемещение танка в зависимости от команд игрока (controls.Commands)
+        if commands.forward:
             self.move(self.player_speed)
-        if keys[pygame.K_s]:
+        if commands.backward:
             self.move(-self.player_speed)
 
         #  проверка на то, не собрал ли пользователь какой-либо бонус
-        bonus_collided = pygame.sprite.spritecollide(self, bonus_group, False)
+        bonus_collided = bonus_group.collide(self)
         if bonus_collided:
             for tile in bonus_collided:
                 bonus = tile.get_bonus_type()
                 if bonus == "ammo":
                     self.bullets += 3
                 elif bonus == "speed":
-                    self.bonus_timer = pygame.time.get_ticks()
+                    self.bonus_timer = game_clock.now()
                     self.speed_bonus_time = 10000
                     self.player_speed = self.player_speed + 2 if \
                         self.player_speed <= self.max_speed else self.max_speed
                 tile.remove_image()
 
+    # изображение танка выбирается из листа поворотов по текущему углу
+    def update_image(self):
+        center = self.rect.center
+        self.image = self.sheet.frame(self.angle)
+        self.rect = self.image.get_rect(center=center)
+        update_sprite(self)
+
     #  вращение танка на определенный угол
     def rotate(self, angle):
         self.angle = (self.angle + angle) % 360
-        rect = self.image.get_rect(center=(self.rect.x + self.rect.w // 2,
-                                           self.rect.y + self.rect.h // 2))
-        rot_image = pygame.transform.rotate(self.image, -angle)
-        rot_rect = rot_image.get_rect(center=rect.center)
-        self.image = rot_image
-        self.rect = rot_rect
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, enemies_group):
+        self.update_image()
+        if walls_group.collideany(self) or \
+                enemies_group.collideany(self):
             self.move(-self.player_speed + 10)
             self.move(self.player_speed + 10)
 
     def shot(self):
         if self.time_of_the_shot == -1 and self.bullets != 0:
-            AnimatedShot(r"sprites\animated_shot", self.rect.x, self.rect.y,
-                         self.angle)
-            Bullet(r"sprites\animated_shot", self.rect.x, self.rect.y,
-                   self.angle, self.damage, enemies_group)
+            shot_pool.acquire().launch(SHOT_SPRITES, self.rect.x, self.rect.y,
+                                       self.angle)
+            fire_bullet(self.rect.x, self.rect.y, self.angle, self.damage, PLAYER_TEAM)
             sound_of_shot.play()
-            self.time_of_the_shot = pygame.time.get_ticks()
+            stats["shots_fired"] += 1
+            self.time_of_the_shot = game_clock.now()
             self.bullets -= 1
 
     def get_hp(self):
@@ -182,11 +409,11 @@ class Player(pygame.sprite.Sprite):
     def get_bonus_timer(self):
         if self.speed_bonus_time == 0:
             return 0
-        return pygame.time.get_ticks() - self.bonus_timer
+        return game_clock.now() - self.bonus_timer
 
     #  метод,  возвращающий количество прошедших миллисекунд с момента выстрела
     def get_left_reload_time(self):
-        return pygame.time.get_ticks() - self.time_of_the_shot \
+        return game_clock.now() - self.time_of_the_shot \
             if self.time_of_the_shot != -1 else self.reload_time
 
     def update_reload_time(self):
@@ -194,13 +421,6 @@ class Player(pygame.sprite.Sprite):
             if self.get_left_reload_time() >= self.reload_time:
                 self.time_of_the_shot = -1
 
-    # метод остановки всех таймеров
-    def pause_timers(self, time):
-        if self.bonus_timer > 0:
-            self.bonus_timer += time
-        if self.time_of_the_shot != -1:
-            self.time_of_the_shot += time
-
     #  функция нанесения урона танку от попадания снаряда
     def get_damaged(self, damage):
         if self.is_alive:
@@ -209,18 +429,24 @@ class Player(pygame.sprite.Sprite):
             if self.hp <= 0:
                 self.hp = 0
                 self.is_alive = False
-                self.image = load_image(r"textures\tanks\killed tank.png", -1)
-                angle = self.angle
-                self.angle = -90
-                self.rotate(angle)
+                self.sheet = assets.sheet(KILLED_TANK_IMAGE, -1)
+                self.update_image()
 
 
 #  класс анимированного выстрела
+# объекты создаются заранее и берутся из пула shot_pool, параметры выстрела задаются методом launch
 class AnimatedShot(pygame.sprite.Sprite):
-    def __init__(self, filepath, x, y, angle):
-        super().__init__(all_sprites)
-        self.angle = angle + 90
+    def __init__(self):
+        super().__init__()
+        self.angle = 0
         self.frames = []
+        self.cur_frame = 0
+        self.counter = -1
+        self.image = None
+        self.rect = None
+
+    def launch(self, filepath, x, y, angle):
+        self.angle = angle + 90
         self.load_sprites(filepath)
         self.cur_frame = 0
         self.image = self.frames[self.cur_frame]
@@ -233,12 +459,13 @@ class AnimatedShot(pygame.sprite.Sprite):
             self.rect = self.image.get_rect().move(x - 2, y + 35)
         elif self.angle == 270:
             self.rect = self.image.get_rect().move(x - 20, y - 2)
+        self.add(effects_group, all_sprites)
 
     def load_sprites(self, filepath):
+        # кадры берутся из общего кэша уже повёрнутыми
+        self.frames.clear()
         for i in range(1, 6):
-            image = load_image(filepath + f"/Flash_A_0{i}.png")
-            image = pygame.transform.rotate(image, -self.angle)
-            self.frames.append(image)
+            self.frames.append(assets.rotated(filepath + f"/Flash_A_0{i}.png", -self.angle))
 
     def update(self):
         self.counter += 1
@@ -248,92 +475,94 @@ class AnimatedShot(pygame.sprite.Sprite):
                 self.image = self.frames[self.cur_frame]
             else:
                 self.kill()
+                shot_pool.release(self)
+
+
+# выпуск снаряда танком, стоящим в точке (x, y) и повёрнутым на угол angle
+# сами снаряды симулируются пакетно в bullets (projectiles.ProjectileEngine)
+def fire_bullet(x, y, angle, damage, team):
+    angle = (angle + 90) % 360
+    offset_x, offset_y, dx, dy = BULLET_LAUNCH[angle]
+    image = shell_images[angle]
+    bullets.spawn(x + offset_x, y + offset_y, image.get_width(), image.get_height(),
+                  dx, dy, damage, team, angle)
+
+
+# полоса, которую пролетает снаряд танка с прямоугольником rect, повёрнутого на angle, на расстоянии length
+def shell_lane(rect, angle, length=FIRE_RANGE):
+    angle = (angle + 90) % 360
+    offset_x, offset_y, dx, dy = BULLET_LAUNCH[angle]
+    shell = shell_images[angle].get_rect().move(rect.x + offset_x, rect.y + offset_y)
+    steps = length // max(abs(dx), abs(dy))
+    return shell.union(shell.move(dx * steps, dy * steps))
+
+
+# шаг симуляции всех снарядов
+def update_bullets():
+    tanks = [player] + enemies_group.sprites()
+    rects = numpy.array([(tank.rect.x, tank.rect.y, tank.rect.w, tank.rect.h) for tank in tanks])
+    teams = numpy.array([PLAYER_TEAM] + [ENEMY_TEAM] * (len(tanks) - 1))
+    alive = numpy.array([tank.is_alive for tank in tanks])
+    hits, explosions = bullets.step(rects, teams, alive)
+    for tank, damage in hits:
+        # статистика считает урон, нанесённый живым танкам (включая добивающий сверх остатка hp)
+        stats["damage_taken" if tank == 0 else "damage_dealt"] += damage
+        tanks[tank].get_damaged(damage)
+    if explosions:
+        explosion_sound.play()
 
 
-#  класс снаряда танка
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, filepath, x, y, angle, damage, group):
-        super().__init__(bullets_group, all_sprites)
-        self.angle = angle + 90
-        self.damage = damage
-        self.enemies = group  # группа спрайтов, которой снаряд будет наносить урон
-        self.image = pygame.transform.rotate(
-            load_image(filepath + "/Heavy_Shell.png"),
-            self.angle)
-        self.explosion_frames = []
-        self.load_sprites(filepath)
-        self.counter = -1
-        self.cur_frame = 0
-        if self.angle == 0 or self.angle == 360:
-            self.rect = self.image.get_rect().move(x + 14, y - 22)
-            self.dx, self.dy = 0, -30
-        elif self.angle == 90:
-            self.rect = self.image.get_rect().move(x + 35, y + 15)
-            self.dx, self.dy = 30, 0
-        elif self.angle == 180:
-            self.rect = self.image.get_rect().move(x + 14, y + 35)
-            self.dx, self.dy = 0, 30
-        elif self.angle == 270:
-            self.rect = self.image.get_rect().move(x - 20, y + 13)
-            self.dx, self.dy = -30, 0
+# камера: сущности всегда хранят мировые координаты,
+# смещение камеры применяется только при отрисовке
+class Camera:
+    def __init__(self):
+        # мировые координаты левого верхнего угла окна камеры
+        self.x = 0
+        self.y = 0
 
-    def load_sprites(self, filepath):
-        for i in range(1, 9):
-            image = load_image(filepath + f"/Explosion_{i}.png")
-            image = pygame.transform.rotate(image, -self.angle)
-            self.explosion_frames.append(image)
+    # камера центрируется на цели
+    def update(self, target):
+        self.x = target.rect.centerx - WIDTH // 2
+        self.y = target.rect.centery - HEIGHT // 2
 
-    def detonate(self):
-        explosion_sound.play()
-        self.counter = 0
-        center = self.rect.x + 16, self.rect.y + 16
-        self.image = self.explosion_frames[self.cur_frame]
-        self.rect = self.image.get_rect(center=center)
+    # перевод мировых координат в экранные
+    def world_to_screen(self, x, y):
+        return x - self.x, y - self.y
 
-    def update(self):
-        if self.counter == -1:
-            self.rect = self.rect.move(self.dx, self.dy)
-            if pygame.sprite.spritecollideany(self, walls_group):
-                self.detonate()
-            sprites = pygame.sprite.spritecollide(self, self.enemies,
-                                                  dokill=False)
-            # проверка снаряда на столкновение с танком
-            if sprites:
-                self.detonate()
-                for enemy in sprites:
-                    if enemy.is_alive:
-                        enemy.get_damaged(self.damage)
-        else:
-            self.counter += 1
-            if self.cur_frame != 7:
-                self.cur_frame += 1
-                self.image = self.explosion_frames[self.cur_frame]
-            else:
-                self.kill()
+    # перевод экранных координат в мировые
+    def screen_to_world(self, x, y):
+        return x + self.x, y + self.y
 
+    # прямоугольник объекта в экранных координатах
+    def apply(self, rect):
+        return rect.move(-self.x, -self.y)
 
-class Camera:
-    def __init__(self):
-        self.dx = 0
-        self.dy = 0
+    # части экрана, занятые видимыми спрайтами группы
+    def sprite_areas(self, group):
+        view = self.get_view()
+        return [pygame.Rect(sprite.rect.x - self.x, sprite.rect.y - self.y, *sprite.image.get_size())
+                for sprite in group.sprites() if view.colliderect(sprite.rect)]
 
-    def apply(self, obj):
-        obj.rect.x += self.dx
-        obj.rect.y += self.dy
+    # видимая область в мировых координатах
+    def get_view(self):
+        return pygame.Rect(self.x, self.y, WIDTH, HEIGHT)
 
-    def update(self, target):
-        global spawnpoints
-        self.dx = -(target.rect.x + target.rect.w // 2 - WIDTH // 2)
-        self.dy = -(target.rect.y + target.rect.h // 2 - HEIGHT // 2)
-        for i in range(len(spawnpoints)):
-            spawnpoints[i] = spawnpoints[i][0] + self.dx, \
-                             spawnpoints[i][1] + self.dy
+    def is_visible(self, rect):
+        return self.get_view().colliderect(rect)
+
+    # отрисовка только тех спрайтов группы, которые попадают в окно камеры
+    # или в заданную часть экрана area
+    def draw(self, group, surface, area=None):
+        view = area.move(self.x, self.y) if area else self.get_view()
+        for sprite in group.sprites():
+            if view.colliderect(sprite.rect):
+                surface.blit(sprite.image, (sprite.rect.x - self.x, sprite.rect.y - self.y))
 
 
 #  класс кнокпи
 class Button:
     def __init__(self, x, y, filepath):
-        self.image = pygame.image.load(filepath)  # загрузка изображение кнопки
+        self.image = assets.image(filepath)  # загрузка изображение кнопки
         self.rect = self.image.get_rect().move(x, y)  # перемещение кнокпи на заданные координаты
         self.x, self.y = x, y
         self.width = self.image.get_width()
@@ -356,67 +585,69 @@ class Button:
 
 # класс вражеского танка
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self, image, pos_x, pos_y):
-        super().__init__(enemies_group, all_sprites)
-        self.image = image
-        self.rect = self.image.get_rect().move(pos_x, pos_y)
+    def __init__(self, sheet, pos_x, pos_y):
         self.angle = 270
-        self.speed = 1
-        self.hp = 75
-        self.damage = 10
-        self.reload_time = 2500
+        self.sheet = sheet
+        self.image = sheet.frame(self.angle)
+        self.rect = self.image.get_rect().move(pos_x, pos_y)
+        super().__init__(enemies_group, all_sprites)
+        global alive_enemies
+        alive_enemies += 1
+        self.speed = enemy_params["speed"]
+        self.hp = enemy_params["hp"]
+        self.damage = enemy_params["damage"]
+        self.reload_time = enemy_params["reload_time"]
         self.time_of_the_shot = -1
         self.is_alive = True
-        # координаты поля видимости танка
-        self.direction_coords = (self.rect.x + 10, self.rect.y - 500,
-                                 self.rect.x + 70, self.rect.y)
-        self.sight = pygame.sprite.Sprite()
-        self.sight.image = pygame.Surface([80, 500])
-        self.sight.rect = self.sight.image.get_rect().move(self.direction_coords[0],
-                                                           self.direction_coords[1])
         self.last_movement = -1
+        self.detour_until = -1  # до этого момента танк не едет по полю путей, а объезжает препятствие
+        self.plan = HOLD  # план движения до следующего решения (см. think)
+        self.next_think = -1  # номер шага логики, на котором танк примет следующее решение
 
     def movement(self):
         self.rect = self.rect.move(self.speed *
                                    math.cos(math.radians(self.angle)),
                                    self.speed *
                                    math.sin(math.radians(self.angle)))
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, player_group):
+        update_sprite(self)
+        if walls_group.collideany(self) or \
+                player_group.collideany(self):
             self.rect = self.rect.move(-self.speed *
                                        math.cos(math.radians(self.angle)),
                                        -self.speed *
                                        math.sin(math.radians(self.angle)))
+            update_sprite(self)
             self.rotate((self.angle + 90) % 360)
 
+    def update_image(self):
+        center = self.rect.center
+        self.image = self.sheet.frame(self.angle)
+        self.rect = self.image.get_rect(center=center)
+        update_sprite(self)
+
     def rotate(self, angle):
         self.angle = (self.angle + angle) % 360
-        rect = self.image.get_rect(center=(self.rect.x + self.rect.w // 2,
-                                           self.rect.y + self.rect.h // 2))
-        rot_image = pygame.transform.rotate(self.image, -angle)
-        rot_rect = rot_image.get_rect(center=rect.center)
-        self.image = rot_image
-        self.rect = rot_rect
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, enemies_group):
+        self.update_image()
+        if walls_group.collideany(self) or \
+                enemies_group.collideany(self):
             self.move(-self.speed + 10)
             self.move(self.speed + 10)
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, player_group):
+        if walls_group.collideany(self) or \
+                player_group.collideany(self):
             return False
         return True
 
     def shot(self):
         if self.time_of_the_shot == -1:
-            AnimatedShot(r"sprites\animated_shot", self.rect.x, self.rect.y,
-                         self.angle)
-            Bullet(r"sprites\animated_shot", self.rect.x, self.rect.y,
-                   self.angle, self.damage, player_group)
+            shot_pool.acquire().launch(SHOT_SPRITES, self.rect.x, self.rect.y,
+                                       self.angle)
+            fire_bullet(self.rect.x, self.rect.y, self.angle, self.damage, ENEMY_TEAM)
             sound_of_shot.play()
-            self.time_of_the_shot = pygame.time.get_ticks()
+            stats["enemy_shots"] += 1
+            self.time_of_the_shot = game_clock.now()
 
     def get_left_reload_time(self):
-        return pygame.time.get_ticks() - self.time_of_the_shot \
+        return game_clock.now() - self.time_of_the_shot \
             if self.time_of_the_shot != -1 else self.reload_time
 
     def update_reload_time(self):
@@ -425,168 +656,345 @@ class Enemy(pygame.sprite.Sprite):
                 self.time_of_the_shot = -1
 
     def get_damaged(self, damage):
+        global alive_enemies
         if self.is_alive:
             self.hp -= damage
             if self.hp <= 0:
                 self.hp = 0
                 self.is_alive = False
-                self.image = load_image(r"textures\tanks\killed tank.png", -1)
-                angle = self.angle
-                self.angle = 270
-                while self.angle != angle:
-                    self.rotate(90)
-                self.add(walls_group)
-
-    #  метод, вращающий поле видимости
-    def rotate_direction(self, angle):
-        if angle == 90:
-            return self.rect.x + 10, self.rect.y, self.rect.x + 70, self.rect.y + 500
-        elif angle == 180:
-            return self.rect.x - 500, self.rect.y + 10, self.rect.x, self.rect.y + 70
-        elif angle == 270:
-            return self.rect.x + 10, self.rect.y - 500, self.rect.x + 70, self.rect.y
-        elif angle == 0:
-            return self.rect.x, self.rect.y + 10, self.rect.x + 500, self.rect.y + 70
-
-    def player_in_sight(self, x1, y1, x2, y2):
-        # проверка того, что игрок находится в поле видимости танка
-        return not (x1 > player.rect.x + player.rect.width or x2 < player.rect.x or
-                    y1 > player.rect.y + player.rect.height or y2 < player.rect.y)
-
-    def check_distance(self):
-        # дистанция до танка игрока
-        return math.sqrt((self.rect.x - player.rect.x) * (self.rect.x - player.rect.x) +
-                         (self.rect.y - player.rect.y) * (self.rect.y - player.rect.y))
+                alive_enemies -= 1
+                self.sheet = assets.sheet(KILLED_TANK_IMAGE, -1)
+                self.update_image()
+                self.add(walls_group, wrecks_group)
+                stats["enemies_destroyed"] += 1
+                # подбитый танк загораживает обзор и дорогу
+                visibility.invalidate()
+                flow_field.invalidate()
 
     def move(self, speed):
         self.rect = self.rect.move(speed *
                                    math.cos(math.radians(self.angle)),
                                    speed *
                                    math.sin(math.radians(self.angle)))
-        if pygame.sprite.spritecollideany(self, walls_group) or \
-                pygame.sprite.spritecollideany(self, enemies_group):
+        update_sprite(self)
+        if walls_group.collideany(self) or \
+                enemies_group.collideany(self):
             self.rect = self.rect.move(-speed *
                                        math.cos(math.radians(self.angle)),
                                        -speed *
                                        math.sin(math.radians(self.angle)))
+            update_sprite(self)
+
+    # шаг вперёд, если он не приводит к столкновению со стенами, игроком или другими врагами
+    def step(self):
+        rect = self.rect
+        self.rect = self.rect.move(self.speed * math.cos(math.radians(self.angle)),
+                                   self.speed * math.sin(math.radians(self.angle)))
+        update_sprite(self)
+        if walls_group.collideany(self) or player_group.collideany(self) or \
+                any(other is not self for other in enemies_group.collide(self)):
+            self.rect = rect
+            update_sprite(self)
+            return False
+        return True
 
-    def rotate_sight(self, x1, y1, x2, y2):
-        if self.angle == 0 or self.angle == 90:
-            self.sight.rect.x, self.sight.rect.y = x1, y1
+    # движение к игроку по общему полю путей (см. pathfinding.py)
+    # танк едет от центра клетки к центру соседней, поэтому перед поворотом выравнивается поперёк движения
+    # возвращает False, если пути из текущей клетки нет
+    def follow_path(self):
+        grid = battle_map.grid
+        x, y = grid.cell_at(*self.rect.center)
+        angle = flow_field.direction(x, y)
+        if angle is None:
+            return False
+        if angle in (0, 180):
+            offset = int((y + 0.5) * grid.tile_height) - self.rect.centery
+            across = 90 if offset > 0 else 270
         else:
-            self.sight.rect.x, self.sight.rect.y = x2, y2
-        self.sight.rect.width = abs(x1 - x2)
-        self.sight.rect.height = abs(y1 - y2)
+            offset = int((x + 0.5) * grid.tile_width) - self.rect.centerx
+            across = 0 if offset > 0 else 180
+        if abs(offset) >= self.speed:
+            angle = across
+        if angle != self.angle:
+            turn = angle - self.angle
+            if not self.rotate(turn):
+                self.rotate(-turn)
+                self.detour_until = game_clock.now() + DETOUR_TIME
+        elif not self.step():
+            self.detour_until = game_clock.now() + DETOUR_TIME
+        return True
 
-    # метод, описывающий поведение танка
-    def update(self):
-        self.direction_coords = self.rotate_direction(self.angle)
-        if self.is_alive:
-            time = pygame.time.get_ticks()
-            x1, y1, x2, y2 = self.direction_coords
-            if self.time_of_the_shot == -1 or time - self.time_of_the_shot >= self.reload_time:
-                if self.player_in_sight(x1, y1, x2, y2):
-                    player_x, player_y = player.rect.x, player.rect.y
-                    self.rotate_sight(x1, y1, player_x, player_y)
-                    if not pygame.sprite.spritecollideany(self.sight, walls_group):
-                        self.time_of_the_shot = -1
-                        self.shot()
-                    else:
-                        self.move(self.speed + 5)
-            if self.player_in_sight(*self.rotate_direction((self.angle + 90) % 360)) or self.player_in_sight(
-                    *self.rotate_direction((self.angle + 180) % 360)) or self.player_in_sight(
-                *self.rotate_direction((self.angle + 270) % 360)):
-                if not self.player_in_sight(x1, y1, x2, y2) and time - self.last_movement > 1200:
-                    x1, y1, x2, y2 = self.rotate_direction((self.angle + 90) % 360)
-                    self.last_movement = time
-                    if self.player_in_sight(x1, y1, x2, y2):
-                        f = self.rotate(90)
-                        if f:
-                            self.direction_coords = (x1, y1, x2, y2)
-                        else:
-                            self.rotate(-90)
-                    else:
-                        x1, y1, x2, y2 = self.rotate_direction((self.angle - 90) % 360)
-                        f = self.rotate(-90)
-                        if f:
-                            self.direction_coords = (x1, y1, x2, y2)
-                        else:
-                            self.rotate(90)
-            elif (time - self.last_movement > 5000) or self.last_movement == -1:
+    # сдвиг поперёк направления на игрока, пока он не окажется на линии огня (см. think)
+    def align(self):
+        dx = player.rect.centerx - self.rect.centerx
+        dy = player.rect.centery - self.rect.centery
+        if abs(dx) >= abs(dy):
+            angle = 90 if dy > 0 else 270
+        else:
+            angle = 0 if dx > 0 else 180
+        if angle != self.angle:
+            turn = angle - self.angle
+            if not self.rotate(turn):
+                self.rotate(-turn)
+                self.detour_until = game_clock.now() + DETOUR_TIME
+        elif not self.step():
+            self.detour_until = game_clock.now() + DETOUR_TIME
+
+    # попадёт ли в игрока снаряд, выпущенный под углом angle (полоса полёта снаряда в пределах обзора)
+    # танк поворачивается к игроку, только если снаряд до него долетит: иначе он может стрелять мимо,
+    # а при движении по полю путей - бесконечно поворачиваться туда и обратно
+    def player_in_line_of_fire(self, angle):
+        rect = self.sheet.frame(angle).get_rect(center=self.rect.center)
+        return shell_lane(rect, angle).colliderect(player.rect)
+
+    # углы, на линии огня которых сейчас находится игрок
+    def directions_to_player(self):
+        return {angle for angle in (0, 90, 180, 270) if self.player_in_line_of_fire(angle)}
+
+    # решение танка: обзор, выстрел, повороты к игроку и выбор плана движения
+    # вызывается планировщиком (ai.AIScheduler) не на каждом шаге логики
+    def think(self):
+        time = game_clock.now()
+        seen = self.directions_to_player()
+        if self.time_of_the_shot == -1 or time - self.time_of_the_shot >= self.reload_time:
+            if self.angle in seen:
+                # между танком и игроком не должно быть препятствий
+                if visibility.can_see(self.rect, player.rect):
+                    self.time_of_the_shot = -1
+                    self.shot()
+                else:
+                    self.move(self.speed + 5)
+        self.plan = HOLD
+        if seen - {self.angle}:
+            if self.angle not in seen and time - self.last_movement > 1200:
                 self.last_movement = time
-                angle = random.choice([-90, 90])
-                x1, y1, x2, y2 = self.rotate_direction(((self.angle + angle) % 360))
-                f = self.rotate(angle)
-                if f:
-                    self.direction_coords = (x1, y1, x2, y2)
+                if (self.angle + 90) % 360 in seen:
+                    if not self.rotate(90):
+                        self.rotate(-90)
                 else:
-                    self.rotate(90)
+                    if not self.rotate(-90):
+                        self.rotate(90)
+        elif self.angle in seen and visibility.can_see(self.rect, player.rect):
+            # игрок на линии огня, танк стоит на месте и ждёт перезарядки
+            pass
+        elif time >= self.detour_until and self.near_player() and visibility.can_see(self.rect, player.rect):
+            # вплотную к игроку танк не подъезжает: с близкого расстояния он выходит на линию огня сбоку
+            self.plan = ALIGN
+        elif time >= self.detour_until and \
+                flow_field.direction(*battle_map.grid.cell_at(*self.rect.center)) is not None:
+            self.plan = FOLLOW_PATH
+        elif (time - self.last_movement > 5000) or self.last_movement == -1:
+            self.last_movement = time
+            angle = rng.choice([-90, 90])
+            if not self.rotate(angle):
+                self.rotate(90)
+        else:
+            self.plan = WANDER
+
+    # ближе ли игрок, чем STANDOFF_DISTANCE
+    def near_player(self):
+        dx = player.rect.centerx - self.rect.centerx
+        dy = player.rect.centery - self.rect.centery
+        return dx * dx + dy * dy <= STANDOFF_DISTANCE * STANDOFF_DISTANCE
+
+    # действие танка на каждом шаге логики: движение по плану, выбранному в think
+    def act(self):
+        if self.plan == FOLLOW_PATH and (game_clock.now() < self.detour_until or not self.follow_path()):
+            self.plan = WANDER
+        if self.plan == ALIGN:
+            if game_clock.now() < self.detour_until:
+                self.plan = WANDER
             else:
-                self.movement()
+                self.align()
+        if self.plan == WANDER:
+            self.movement()
 
 
 #  функция перезапуска игры
-def restart_game(current_level):
-    global all_sprites, walls_group, tiles_group, \
-        player_group, clock, battle_map, camera, \
-        player, sound_of_shot, engine_sound, \
-        movement_sound, explosion_sound, bonus_group, \
-        enemies_group, bullets_group, enemy_count, \
-        spawnpoints, btn_pressed_sound, start_time
+# seed - начальное значение генератора случайных чисел (None - случайное),
+# ai - изменения параметров вражеских танков относительно ENEMY_PARAMS
+# если уровень с теми же параметрами уже загружен, он восстанавливается из снимка, а не строится заново
+def restart_game(current_level, seed=None, ai=None):
+    global clock, camera, game_clock, timestep, game_result, stats, recorder, \
+        sound_of_shot, engine_sound, movement_sound, explosion_sound, btn_pressed_sound
 
-    # группы спрайтов
-    all_sprites = pygame.sprite.Group()
-    walls_group = pygame.sprite.Group()
-    tiles_group = pygame.sprite.Group()
-    player_group = pygame.sprite.Group()
-    bonus_group = pygame.sprite.Group()
-    enemies_group = pygame.sprite.Group()
-    bullets_group = pygame.sprite.Group()
+    # при запуске с окном ресурсы боя догружаются в фоне, пока открыто меню
+    if not battle_ready:
+        loading_screen()
 
-    #  точки спавна
-    spawnpoints = [(x * tile_width, y * tile_height)
-                   for x, y in SPAWNPOINTS_FOR_LEVELS[current_level - 1]]
+    # вспышки, оставшиеся с прошлой игры, возвращаются в пул
+    shot_pool.release_all()
 
     clock = pygame.time.Clock()
+    # seed выбирается явно, чтобы бой можно было повторить по записи
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    rng.seed(seed)
+    recorder = ReplayRecorder(current_level, seed, ai)
+    game_result = None
+    # статистика боя
+    stats = {"shots_fired": 0, "enemy_shots": 0, "damage_dealt": 0,
+             "damage_taken": 0, "enemies_destroyed": 0}
+
+    # время внутри игры, по нему работают все таймеры танков
+    game_clock = GameClock(TICK_RATE)
+    timestep = FixedTimestep(TICK_RATE, MAX_TICKS_PER_FRAME)
+
+    params = {**ENEMY_PARAMS, **(ai or {})}
+    if level_snapshot is not None and level_snapshot.key == (current_level, params) and \
+            not level_changed():
+        restore_level()
+    else:
+        load_level_state(current_level, params)
+
+    camera = Camera()
+    dirty.invalidate()
+
+    # звуки (берутся из кэша, при перезапуске заново не создаются)
+    sound_of_shot = assets.sound("sounds/shot.wav")
+    engine_sound = assets.sound("sounds/engine_sound.wav")
+    movement_sound = assets.sound("sounds/movement.wav")
+    explosion_sound = assets.sound("sounds/explosion.wav")
+    btn_pressed_sound = assets.sound("sounds/btn_pressed.wav")
+    engine_sound.play(loops=-1)
 
-    start_time = datetime.datetime.now()
 
-    x, y = spawnpoints.pop(1)
-    Enemy(load_image("textures/tanks/enemy tank.png", -1), x, y)
-    enemy_count = 4
+# полная загрузка уровня: группы спрайтов, карта, танки
+# после загрузки снимается снимок, из которого уровень потом восстанавливается при перезапуске
+def load_level_state(current_level, params):
+    global all_sprites, walls_group, tiles_group, player_group, bonus_group, \
+        enemies_group, effects_group, wrecks_group, battle_map, visibility, flow_field, bullets, \
+        player, enemy_params, spawn_index, wave, pending_enemies, alive_enemies, level_snapshot
+
+    # группы спрайтов
+    # для групп, с которыми проверяются столкновения, используется пространственный индекс по сетке клеток
+    all_sprites = pygame.sprite.Group()
+    walls_group = SpatialGroup(tile_width, tile_height)
+    tiles_group = pygame.sprite.Group()
+    player_group = SpatialGroup(tile_width, tile_height)
+    bonus_group = SpatialGroup(tile_width, tile_height)
+    enemies_group = SpatialGroup(tile_width, tile_height)
+    effects_group = pygame.sprite.Group()
+    wrecks_group = pygame.sprite.Group()  # подбитые вражеские танки
+
+    enemy_params = params
+    # враги появляются волнами во время боя (см. check_enemies)
+    wave = 0
+    pending_enemies = 0
+    alive_enemies = 0
 
     battle_map = Map(f"level{current_level}.tmx")
     battle_map.render()
+    visibility = Visibility(battle_map.grid, wrecks_group)
+    flow_field = FlowField(battle_map.grid, wrecks_group)
+    bullets = ProjectileEngine(battle_map.grid)
+
+    x, y = PLAYER_SPAWNS[current_level - 1]
+    player = Player(assets.sheet(PLAYER_TANK_IMAGE, -1), x * tile_width, y * tile_height)
+
+    # места появления врагов: клетки, где помещается танк и откуда можно доехать до игрока
+    cached = spawn_cells.get(current_level)
+    if cached is None or cached[0] is not battle_map.source:
+        flow_field.set_target(battle_map.grid.cell_at(*player.rect.center))
+        cached = spawn_cells[current_level] = (battle_map.source, flow_field.reachable_cells())
+    # индекс проверяет места по сетке этого запуска уровня (на ней отмечаются собранные бонусы)
+    spawn_index = SpawnIndex(cached[1], battle_map.grid)
+
+    # во время боя меняются только танки и бонусы, стены остаются на месте
+    level_snapshot = LevelSnapshot((current_level, params), battle_map.grid,
+                                   [player] + enemies_group.sprites() + bonus_group.sprites(),
+                                   [enemies_group, all_sprites],
+                                   {"wave": wave, "pending_enemies": pending_enemies,
+                                    "alive_enemies": alive_enemies})
+
+
+# восстановление загруженного уровня из снимка: сбрасывается только то, что изменилось за бой
+def restore_level():
+    global wave, pending_enemies, alive_enemies
+    values = level_snapshot.restore(battle_map.grid)
+    wave = values["wave"]
+    pending_enemies = values["pending_enemies"]
+    alive_enemies = values["alive_enemies"]
+    if battle_map.layer is not None:
+        battle_map.layer.reset()
+    bullets.clear()
+    # подбитые танки убраны, видимость и пути считаются заново
+    visibility.invalidate()
+    flow_field.invalidate()
+
+
+# полное состояние боя (для ключевых кадров при воспроизведении повторов)
+def save_state():
+    return LevelSnapshot(None, battle_map.grid,
+                         [player] + enemies_group.sprites() + bonus_group.sprites() + tiles_group.sprites(),
+                         [enemies_group, all_sprites],
+                         {"wave": wave, "pending_enemies": pending_enemies, "alive_enemies": alive_enemies,
+                          "stats": stats,
+                          "game_result": game_result, "ticks": game_clock.ticks, "rng": rng.getstate(),
+                          "bullets": bullets.save_state()})
+
+
+# возврат к сохранённому состоянию боя
+def load_state(state):
+    global wave, pending_enemies, alive_enemies, stats, game_result
+    # вспышки выстрелов - только эффект, они не сохраняются
+    shot_pool.release_all()
+    values = state.restore(battle_map.grid)
+    wave = values["wave"]
+    pending_enemies = values["pending_enemies"]
+    alive_enemies = values["alive_enemies"]
+    stats = values["stats"]
+    game_result = values["game_result"]
+    game_clock.ticks = values["ticks"]
+    rng.setstate(values["rng"])
+    bullets.load_state(values["bullets"])
+    if battle_map.layer is not None:
+        battle_map.layer.reset()
+        for tile in tiles_group:
+            battle_map.layer.set_tile(*tile.coords, tile.image)
+    visibility.invalidate()
+    flow_field.invalidate()
+    dirty.invalidate()
+    timestep.reset()
+
+
+# изменились ли файлы загруженного уровня после загрузки
+def level_changed():
+    if battle_map.level is None:
+        return False
+    return load_level(f"maps/{battle_map.filename}") is not battle_map.level
 
-    x, y = spawnpoints.pop(0)
-    player = Player(load_image("textures/tanks/player tank.png", -1), x, y)
-    camera = Camera()
 
-    # звуки
-    sound_of_shot = pygame.mixer.Sound("sounds/shot.wav")
-    engine_sound = pygame.mixer.Sound("sounds/engine_sound.wav")
-    movement_sound = pygame.mixer.Sound("sounds/movement.wav")
-    explosion_sound = pygame.mixer.Sound("sounds/explosion.wav")
-    btn_pressed_sound = pygame.mixer.Sound("sounds/btn_pressed.wav")
-    engine_sound.play(loops=-1)
+# события меню
+# меню статичны, поэтому вместо холостого цикла ожидается следующее событие,
+# а окно выводится заново только после изменений (redraw) или когда его нужно восстановить
+def menu_events():
+    event = pygame.event.wait(MENU_WAIT)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
 
 
 # окно с управлением
 def controls_menu():
-    image = pygame.image.load(r"menu\controls wndw.png")
-    screen.blit(image, (0, 0))
     show_menu = True
     back_btn = Button(20, 620, r"menu\arrowBeige_left.png")
-    back_btn.draw()
+    redraw = True
     while show_menu:
-        for event in pygame.event.get():
+        if redraw:
+            screen.blit(controls_background, (0, 0))
+            back_btn.draw()
+            pygame.display.flip()
+            redraw = False
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                redraw = True
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if back_btn.is_clicked(*event.pos):
                     show_menu = False
-        pygame.display.flip()
 
 
 #  главное меню
@@ -606,33 +1014,60 @@ def main_menu():
     exit_btn = Button(545, 555, r"menu\exit button.png")
 
     show_menu = True
+    redraw = True
     while show_menu:
-        for event in pygame.event.get():
+        preload_battle(current_lvl)
+        if redraw:
+            screen.blit(main_menu_background, (0, 0))
+
+            start_btn.draw()
+            select_lvl_btn.draw()
+            exit_btn.draw()
+            records_btn.draw()
+            controls_btn.draw()
+
+            pygame.display.flip()
+            redraw = False
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                redraw = True
             if event.type == pygame.MOUSEBUTTONDOWN:
+                # вложенные окна рисуют поверх меню, после них меню выводится заново
                 if controls_btn.is_clicked(*event.pos):
                     controls_menu()
+                    redraw = True
                 if start_btn.is_clicked(*event.pos):
                     show_menu = False
                 if exit_btn.is_clicked(*event.pos):
-                    pygame.quit()
+                    close_display()
                     sys.exit()
                 if select_lvl_btn.is_clicked(*event.pos):
                     current_lvl = select_level()
+                    redraw = True
                 if records_btn.is_clicked(*event.pos):
                     records_window()
-        screen.blit(main_menu_background, (0, 0))
+                    redraw = True
+    restart_game(current_lvl)
 
-        start_btn.draw()
-        select_lvl_btn.draw()
-        exit_btn.draw()
-        records_btn.draw()
-        controls_btn.draw()
 
-        pygame.display.flip()
-    restart_game(current_lvl)
+# подготовка боя, пока открыто главное меню (меню ждёт событий, и время простаивает):
+# когда фоновая загрузка закончена, готовятся ресурсы боя и загружается выбранный уровень,
+# поэтому после нажатия "Старт" уровень только восстанавливается из снимка (см. restart_game)
+def preload_battle(current_level):
+    if not loader.done():
+        return
+    if not battle_ready:
+        prepare_battle()
+    params = dict(ENEMY_PARAMS)
+    if level_snapshot is None or level_snapshot.key != (current_level, params):
+        load_level_state(current_level, params)
+        # фоновый поток готовит фрагменты карты вокруг места появления игрока
+        start_view = Camera()
+        start_view.update(player)
+        battle_map.layer.view(start_view, screen.get_rect())
 
 
 # пауза во время игры
@@ -643,14 +1078,16 @@ def pause_menu():
 
     pygame.mixer.pause()
 
-    start_pause_time = pygame.time.get_ticks()
-
+    # кадр боя с кнопками поверх него не меняется, он выводится один раз
+    pygame.display.flip()
     show_menu = True
     while show_menu:
-        for event in pygame.event.get():
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                pygame.display.flip()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if continue_btn.is_clicked(*event.pos):
                     btn_pressed_sound.play()
@@ -665,134 +1102,199 @@ def pause_menu():
                     show_menu = False
                     pygame.mixer.stop()
                     restart_game(current_lvl)
-        pygame.display.flip()
-    player.pause_timers(pygame.time.get_ticks() - start_pause_time)
+    # игровые часы во время паузы стоят, а накопленное реальное время отбрасывается
+    timestep.reset()
+    # меню нарисовано поверх кадра боя
+    dirty.invalidate()
     pygame.mixer.unpause()
 
 
-# функция отрисовки интерфейса во время боя
-def draw_interface():
-    # отрисовка очков жизней у игрока
+# функция обновления интерфейса во время боя
+# элементы перерисовываются на поверхности интерфейса только при изменении значений,
+# на экран интерфейс выводится в draw_game
+def update_interface():
+    # очки жизней у игрока
     hp = player.get_hp()
-    screen.blit(bar, (10, 10))
-    pygame.draw.rect(screen, (255, 0, 0), (17, 17, 206 * (hp / 100), 26))
+    hud.bar("hp", (10, 10), bar, max(0, int(206 * hp / 100)), (255, 0, 0))
 
-    # отрисовка времени перезарядки
+    # время перезарядки
     reload_time = player.get_left_reload_time()
-    screen.blit(bar, (10, 70))
-    pygame.draw.rect(screen, (0, 255, 0), (17, 77, 206 * (reload_time /
-                                                          player.reload_time), 26))
+    hud.bar("reload", (10, 70), bar, max(0, int(206 * reload_time / player.reload_time)), (0, 255, 0))
 
-    # отрисовка количества оставшихся снарядов
-    bullets = font.render(str(player.get_bullets()), True, (0, 255, 0))
-    screen.blit(bullet, (10, 130))
-    screen.blit(bullets, (84, 140))
+    # количество оставшихся снарядов
+    hud.counter("bullets", (10, 130), bullet, player.get_bullets(), (0, 255, 0))
 
+    # количество секунд до окончания действия ускорения
+    seconds = None
     if player.get_bonus_timer() != 0:
-        # отрисовка количества секунд до окончания действия ускорения
-        seconds = font.render(str(10 - player.get_bonus_timer() // 1000), True,
-                              (255, 255, 0))
-        screen.blit(bonus, (10, 204))
-        screen.blit(seconds, (84, 214))
+        seconds = 10 - player.get_bonus_timer() // 1000
+    hud.counter("bonus", (10, 204), bonus, seconds, (255, 255, 0))
+
+
+# один шаг игровой логики
+def update_game():
+    with profiler.phase("input"):
+        commands = controller.get_commands()
+        recorder.record(commands)
+    with profiler.phase("player"):
+        if commands.turn:
+            player.rotate(90 * commands.turn)
+            if walls_group.collideany(player):
+                player.rotate(-90 * commands.turn)
+        if commands.shoot:
+            player.shot()
+        player.movement(commands)
+        player.update_reload_time()
+
+    with profiler.phase("enemies"):
+        # поле путей строится заново, только если игрок перешёл в другую клетку
+        flow_field.set_target(battle_map.grid.cell_at(*player.rect.center))
+        ai_scheduler.update(enemies_group.sprites(), player.rect, game_clock.ticks)
+
+    with profiler.phase("check_enemies"):
+        check_enemies()
+
+    with profiler.phase("effects"):
+        effects_group.update()
+    with profiler.phase("bullets"):
+        update_bullets()
+
+    game_clock.advance()
+
+
+# счётчики кадра для профилировщика
+def count_frame():
+    checks = 0
+    for group in (walls_group, player_group, bonus_group, enemies_group):
+        checks += group.queries
+        group.queries = 0
+    if profiler.enabled:
+        profiler.count("sprite_count", len(all_sprites))
+        profiler.count("shell_count", bullets.active_count())
+        profiler.count("collision_checks", checks)
+        profiler.count("path_cells", flow_field.expanded)
+        profiler.count("ai_thinks", ai_scheduler.thinks)
+        profiler.count("ai_deferred", ai_scheduler.deferred)
+        if battle_map.layer is not None:
+            profiler.count("chunks_baked", battle_map.layer.shared_chunks.baked)
+    if battle_map.layer is not None:
+        battle_map.layer.shared_chunks.baked = 0
+    flow_field.expanded = 0
+    ai_scheduler.thinks = ai_scheduler.deferred = 0
+
+
+# функция, которая следит за волнами врагов и итогом боя
+# живые враги считаются счётчиком alive_enemies (см. Enemy), а не перебором танков
+# когда уничтожена вся волна, появляется следующая; победа - когда уничтожена последняя
+# итог боя записывается в game_result: True - победа, False - поражение
+def check_enemies():
+    global wave, pending_enemies, game_result
+    if not player.is_alive:
+        game_result = False
+        return
+    if pending_enemies == 0 and alive_enemies == 0:
+        if wave == len(enemy_params["waves"]):
+            game_result = True
+            return
+        pending_enemies = enemy_params["waves"][wave]
+        wave += 1
+    if pending_enemies:
+        # танки, для которых сейчас не нашлось места, появятся на следующих шагах
+        while pending_enemies and spawn_enemy():
+            pending_enemies -= 1
+
+
+# новый вражеский танк в свободном месте вдали от игрока, возвращает False, если места не нашлось
+# танк появляется перезаряжающимся, чтобы не стрелять в первый же момент боя
+def spawn_enemy():
+    sheet = assets.sheet(ENEMY_TANK_IMAGE, -1)
+    position = spawn_index.pick(rng, sheet.frame(270).get_size(), player.rect.center, spawn_blocked)
+    if position is None:
+        return False
+    Enemy(sheet, *position).time_of_the_shot = game_clock.now()
+    return True
 
 
-# функция, которая проверяет, остались ли живые враги на карте
-def check_enemies():
-    global enemy_count, new_enemy, spawnpoints
-    flag = False
-    for enemy in enemies_group.sprites():
-        if enemy.is_alive:
-            flag = True
-    if enemy_count > 0 and not flag:
-        enemy_count -= 1
-        x, y = spawnpoints.pop(random.randint(0, len(spawnpoints) - 1))
-        new_enemy = Enemy(load_image("textures/tanks/enemy tank.png", -1), x, y)
-    elif enemy_count == 0:
-        end_window(True)
-    elif not player.is_alive:
-        end_window(False)
+# можно ли поставить новый танк на место rect: оно не должно быть на виду у игрока
+# и не должно быть занято игроком, другими или подбитыми танками
+# (стены проверять не нужно: в индексе только клетки, где танк помещается)
+def spawn_blocked(rect):
+    if visibility.can_see(player.rect, rect):
+        return True
+    for group in (player_group, enemies_group):
+        if any(rect.colliderect(other.rect) for other in group.candidates(rect)):
+            return True
+    return False
 
 
 def end_window(won):
     pygame.mixer.pause()
-    time_delta = datetime.datetime.now() - start_time
+    seconds = game_clock.now() // 1000
     show_menu = True
     pygame.mixer.stop()
     screen.blit(inf_panel, (390, 210))
     if won:
-        screen.blit(font.render("Победа!", True, (255, 0, 0)), (535, 280))
-        screen.blit(font.render(f"Время: {time_delta.seconds} с",
-                                True, (255, 0, 0)), (535, 330))
-
-        f = open(r"records\records.txt", mode="r", encoding="utf8")
-        level_name = "Таможня" if current_lvl == 1 else "Пустыня"
-        res = f"{level_name};{datetime.datetime.now().strftime('%m/%d/%Y')};{time_delta.seconds}"
-        records = f.readlines()
-        f.close()
-        records.append(res)
-        records.sort(key=lambda x: int(x.split(";")[2]))
-
-        f = open(r"records\records.txt", mode="w", encoding="utf8")
-        f.seek(0)
-        for i in range(len(records)):
-            if i == 6:
-                break
-            f.write(records[i].strip() + "\n")
-        f.close()
+        screen.blit(text_cache.render("Победа!", (255, 0, 0)), (535, 280))
+        screen.blit(text_cache.render(f"Время: {seconds} с", (255, 0, 0)), (535, 330))
+
     else:
-        screen.blit(font.render("Поражение", True, (255, 0, 0)), (535, 280))
-        screen.blit(font.render(f"Время: {time_delta.seconds} с",
-                                True, (255, 0, 0)), (535, 330))
+        screen.blit(text_cache.render("Поражение", (255, 0, 0)), (535, 280))
+        screen.blit(text_cache.render(f"Время: {seconds} с", (255, 0, 0)), (535, 330))
+    # в историю попадают все бои, в таблицу рекордов - только победы
+    records.add(current_lvl, seconds, won, stats)
     main_menu_btn = Button(545, 420, r"menu\main menu btn.png")
+    pygame.display.flip()
     while show_menu:
-        for event in pygame.event.get():
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                pygame.display.flip()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if main_menu_btn.is_clicked(*event.pos):
                     show_menu = False
                     main_menu()
-        pygame.display.flip()
 
 
 # окно выбора уровня
 def select_level():
-    screen.blit(main_menu_background, (0, 0))
-    screen.blit(first_level_img, (390, 210))
     current_level = 1
     accept_button = Button(545, 570, r"menu\accept.png")
     left_button = Button(200, 310, r"menu\arrowBeige_left.png")
     right_button = Button(1080, 310, r"menu\arrowBeige_right.png")
-    accept_button.draw()
-    left_button.draw()
-    right_button.draw()
-    screen.blit(font.render("Таможня", True, (255, 0, 0)), (545, 150))
     show_menu = True
+    redraw = True
     while show_menu:
-        for event in pygame.event.get():
+        if redraw:
+            screen.blit(main_menu_background, (0, 0))
+            accept_button.draw()
+            left_button.draw()
+            right_button.draw()
+
+            if current_level == 1:
+                screen.blit(first_level_img, (390, 210))
+                screen.blit(text_cache.render("Таможня", (255, 0, 0)), (540, 150))
+            else:
+                screen.blit(second_level_img, (390, 210))
+                screen.blit(text_cache.render("Пустыня", (255, 0, 0)), (545, 150))
+            pygame.display.flip()
+            redraw = False
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                redraw = True
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if accept_button.is_clicked(*event.pos):
                     show_menu = False
                 if left_button.is_clicked(*event.pos):
+                    redraw = redraw or current_level != 1
                     current_level = 1
                 if right_button.is_clicked(*event.pos):
+                    redraw = redraw or current_level != 2
                     current_level = 2
-        screen.blit(main_menu_background, (0, 0))
-        accept_button.draw()
-        left_button.draw()
-        right_button.draw()
-
-        if current_level == 1:
-            screen.blit(first_level_img, (390, 210))
-            screen.blit(font.render("Таможня", True, (255, 0, 0)), (540, 150))
-        else:
-            screen.blit(second_level_img, (390, 210))
-            screen.blit(font.render("Пустыня", True, (255, 0, 0)), (545, 150))
-        pygame.display.flip()
     return current_level
 
 
@@ -800,96 +1302,260 @@ def select_level():
 def records_window():
     screen.blit(records_background, (0, 0))
 
-    f = open(r"records\records.txt", mode="r", encoding="utf8")
-    records = [r.strip().split(";") for r in f.readlines()]
-    screen.blit(font.render("Карта", True, (255, 0, 0)), (350, 80))
-    screen.blit(font.render("Дата", True, (255, 0, 0)), (600, 80))
-    screen.blit(font.render("Время", True, (255, 0, 0)), (810, 80))
-    for number, record in enumerate(records):
-        screen.blit(font.render(f"{number + 1})   {record[0]}   {record[1]}   {record[2]} c",
-                                True, (255, 0, 0)), (250, 80 + (number + 1) * 60))
-    f.close()
+    screen.blit(text_cache.render("Карта", (255, 0, 0)), (350, 80))
+    screen.blit(text_cache.render("Дата", (255, 0, 0)), (600, 80))
+    screen.blit(text_cache.render("Время", (255, 0, 0)), (810, 80))
+    # лучшие результаты хранятся в памяти, диск при открытии окна не читается
+    for number, (level, seconds, played) in enumerate(records.best()):
+        played = datetime.date.fromisoformat(played).strftime("%m/%d/%Y")
+        screen.blit(text_cache.render(f"{number + 1})   {LEVEL_NAMES[level]}   {played}   {seconds} c",
+                                      (255, 0, 0)), (250, 80 + (number + 1) * 60))
 
     back_btn = Button(50, 600, r"menu\arrowBeige_left.png")
+    # таблица не меняется, пока открыто окно, она выводится один раз
+    pygame.display.flip()
 
     show_menu = True
     while show_menu:
-        for event in pygame.event.get():
+        for event in menu_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
+                close_display()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                pygame.display.flip()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if back_btn.is_clicked(*event.pos):
                     show_menu = False
+
+
+# загрузка ресурсов, общих для всех боёв
+# prepare=False - ресурсы боя готовятся позже, в prepare_battle (при запуске с окном)
+def init_assets(sound_loader=pygame.mixer.Sound, prepare=True):
+    global assets, level_snapshot, battle_ready
+    # снимок уровня ссылается на изображения из прежнего кэша
+    level_snapshot = None
+    # общий кэш изображений и звуков
+    assets = AssetManager(load_image, sound_loader=sound_loader)
+    battle_ready = False
+    if prepare:
+        prepare_battle()
+
+
+# подготовка ресурсов боя: листы поворотов танков, кадры выстрелов и взрывов, звуки, интерфейс
+def prepare_battle():
+    global shot_pool, shell_images, explosion_images, bar, bullet, bonus, battle_ready
+    assets.preload(sheets=[(PLAYER_TANK_IMAGE, -1), (ENEMY_TANK_IMAGE, -1), (KILLED_TANK_IMAGE, -1)],
+                   rotations=[(path, None) for path in FLASH_FRAMES + EXPLOSION_FRAMES + [SHELL_IMAGE]],
+                   sounds=BATTLE_SOUNDS)
+
+    # пул вспышек выстрелов
+    shot_pool = Pool(AnimatedShot, 32)
+
+    # изображения снаряда и кадры взрыва для каждого направления выстрела
+    shell_images = {angle: assets.rotated(SHELL_IMAGE, angle) for angle in CARDINAL_ANGLES}
+    explosion_images = {angle: [assets.rotated(path, -angle) for path in EXPLOSION_FRAMES]
+                        for angle in CARDINAL_ANGLES}
+
+    bar, bullet, bonus = (loader.image(path) for path in INTERFACE_IMAGES)
+    battle_ready = True
+
+
+# экран загрузки: ждёт, пока фоновая загрузка закончится, и показывает её ход
+# если всё уже загружено (обычно - пока игрок был в меню), экран не появляется
+def loading_screen():
+    while not loader.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                close_display()
+                sys.exit()
+        progress = loader.progress()
+        screen.blit(main_menu_background, (0, 0))
+        screen.blit(inf_panel, (390, 210))
+        screen.blit(text_cache.render(f"Загрузка: {int(progress * 100)}%", (255, 0, 0)), (500, 280))
+        pygame.draw.rect(screen, (255, 0, 0), (450, 360, int(380 * progress), 26))
         pygame.display.flip()
+        loader.wait(LOADING_FRAME)
+    prepare_battle()
+    dirty.invalidate()
+
+
+# подготовка к боям без окна и звука (например, для пакетных прогонов)
+# после неё бой запускается через restart_game, а шаги выполняются через update_game
+def init_headless():
+    global headless
+    headless = True
+    init_assets(sound_loader=NullSound)
+
+
+# отрисовка кадра боя
+# пока камера стоит, перерисовываются только изменившиеся области (см. dirty.py),
+# на экран кадр выводится через update_display
+def draw_game():
+    with profiler.phase("map"):
+        camera.update(player)
+        dirty.begin((camera.x, camera.y))
+        layer = battle_map.layer
+        for rect in layer.changed:
+            dirty.mark(camera.apply(rect))
+        layer.changed.clear()
+    with profiler.phase("interface"):
+        update_interface()
+        for rect in hud.changes():
+            dirty.mark(rect)
+    with profiler.phase("shells"):
+        shells = bullets.placements(camera, shell_images, explosion_images)
+        for image, rect in shells:
+            dirty.add(rect)
+    with profiler.phase("sprites"):
+        for group in (player_group, effects_group, enemies_group):
+            for rect in camera.sprite_areas(group):
+                dirty.add(rect)
+
+    regions = dirty.regions()
+    if regions is None:
+        regions = [None]
+    # в каждой области рисуется всё, что в неё попадает, остальная часть экрана не трогается
+    with profiler.phase("map"):
+        for area in regions:
+            screen.set_clip(area)
+            screen.fill((0, 0, 0))
+            layer.draw(screen, camera, area)
+        # фоновый поток начинает готовить соседние фрагменты, когда видимые уже выведены
+        layer.view(camera, screen.get_rect())
+    with profiler.phase("sprites"):
+        for area in regions:
+            screen.set_clip(area)
+            camera.draw(player_group, screen, area)
+            camera.draw(effects_group, screen, area)
+            camera.draw(enemies_group, screen, area)
+    with profiler.phase("shells"):
+        for area in regions:
+            screen.set_clip(area)
+            for image, rect in shells:
+                if area is None or area.colliderect(rect):
+                    screen.blit(image, rect)
+    with profiler.phase("interface"):
+        for area in regions:
+            screen.set_clip(area)
+            hud.draw(screen)
+    screen.set_clip(None)
+
+
+# вывод нарисованного кадра на экран: весь кадр или только изменившиеся области
+def update_display():
+    rects = dirty.end_frame()
+    if rects is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(rects)
+
+
+# создание окна и загрузка ресурсов интерфейса
+# sound_loader - загрузчик звуков (assets.NullSound, чтобы играть без звука)
+def init_display(sound_loader=pygame.mixer.Sound):
+    global font, text_cache, hud, main_menu_background, records_background, controls_background, \
+        first_level_img, second_level_img, inf_panel, screen, btn_pressed_sound, records, loader
+
+    pygame.init()
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+    pygame.font.init()
+    font = pygame.font.Font(None, 64)
+    text_cache = TextCache(font)
+
+    # файлы читаются в фоне: сначала то, что нужно меню, затем всё для боя;
+    # меню появляется, как только готовы его изображения, остальное догружается, пока открыто меню
+    loader = Loader(sound_loader)
+    loader.preload(images=MENU_IMAGES, sounds=["sounds/btn_pressed.wav"])
+    loader.preload(images=[PLAYER_TANK_IMAGE, ENEMY_TANK_IMAGE, KILLED_TANK_IMAGE, SHELL_IMAGE]
+                   + FLASH_FRAMES + EXPLOSION_FRAMES + INTERFACE_IMAGES,
+                   sounds=BATTLE_SOUNDS,
+                   levels=[f"maps/level{n}.tmx" for n in range(1, len(PLAYER_SPAWNS) + 1)])
+
+    main_menu_background = loader.image("menu/background.png")
+    records_background = loader.image("menu/records_backgorund.png")
+    controls_background = loader.image("menu/controls wndw.png")
+    first_level_img = loader.image("menu/level1.PNG")
+    second_level_img = loader.image("menu/level2.PNG")
+    inf_panel = loader.image("menu/panel.png")
+
+    pygame.display.set_caption('Танки')
+    size = WIDTH, HEIGHT
+    screen = pygame.display.set_mode(size)
+    # поверхность интерфейса создаётся после окна, в формате экрана
+    hud = Hud(HUD_SIZE, text_cache)
+
+    records = RecordStore(level_names=LEVEL_NAMES)
+
+    init_assets(loader.sound, prepare=False)
+    btn_pressed_sound = assets.sound("sounds/btn_pressed.wav")
+
+
+# закрытие окна: сначала останавливаются фоновые потоки, которые рисуют фрагменты карты
+def close_display():
+    for level, chunks in baked_chunks.values():
+        chunks.close()
+    baked_chunks.clear()
+    pygame.quit()
+
+
+def main():
+    global controller
+
+    init_display()
+    controller = KeyboardController()
+
+    main_menu()
+
+    running = True
+    while running:
+        with profiler.phase("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        pause_menu()
+                    if event.key == pygame.K_w or event.key == pygame.K_s:
+                        movement_sound.play(loops=-1)
+                    # F3 - профилировщик, F4 - запись замеров кадров в файлы
+                    if event.key == pygame.K_F3:
+                        profiler.toggle()
+                    if event.key == pygame.K_F4 and profiler.trace:
+                        name = f"{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}"
+                        profiler.dump(os.path.join(PROFILE_DIR, f"{name}.csv"))
+                        profiler.dump(os.path.join(PROFILE_DIR, f"{name}.json"))
+                if event.type == pygame.KEYUP:
+                    if event.key == pygame.K_w or event.key == pygame.K_s:
+                        movement_sound.fadeout(750)
+                # повороты, выстрелы и движение выполняются на шагах логики
+                controller.handle_event(event)
+
+        # логика выполняется фиксированными шагами, независимо от скорости отрисовки
+        for _ in range(timestep.advance()):
+            update_game()
+            if game_result is not None:
+                break
 
+        if game_result is not None:
+            # запись боя сохраняется, её можно посмотреть через replay.py
+            name = f"{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}_level{recorder.level}.rpl"
+            recorder.save(os.path.join(REPLAY_DIR, name), game_result)
+            end_window(game_result)
+            continue
 
-pygame.init()
-pygame.mixer.init(frequency=44100, size=-16, channels=2)
-pygame.font.init()
-font = pygame.font.Font(None, 64)
-
-bar = pygame.image.load(r"interface\bar.png")
-bullet = pygame.image.load(r"interface\Bullet.png")
-bonus = pygame.image.load(r"interface\Bonus_Icon.png")
-main_menu_background = pygame.image.load(r"menu\background.png")
-records_background = pygame.image.load(r"menu\records_backgorund.png")
-first_level_img = pygame.image.load(r"menu\level1.PNG")
-second_level_img = pygame.image.load(r"menu\level2.PNG")
-inf_panel = pygame.image.load(r"menu\panel.png")
-
-btn_pressed_sound = pygame.mixer.Sound("sounds/btn_pressed.wav")
-
-pygame.display.set_caption('Танки')
-size = WIDTH, HEIGHT
-screen = pygame.display.set_mode(size)
-
-main_menu()
-
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                pause_menu()
-            if event.key == pygame.K_d:
-                player.rotate(90)
-                if pygame.sprite.spritecollideany(player, walls_group):
-                    player.rotate(-90)
-            elif event.key == pygame.K_a:
-                player.rotate(-90)
-                if pygame.sprite.spritecollideany(player, walls_group):
-                    player.rotate(90)
-            if event.key == pygame.K_w or event.key == pygame.K_s:
-                movement_sound.play(loops=-1)
-            if event.key == pygame.K_SPACE:
-                player.shot()
-        if event.type == pygame.KEYUP:
-            if event.key == pygame.K_w or event.key == pygame.K_s:
-                movement_sound.fadeout(750)
-
-    player.movement()
-    player.update_reload_time()
-
-    enemies_group.update()
-
-    camera.update(player)
-    for sprite in all_sprites:
-        camera.apply(sprite)
-
-    check_enemies()
-
-    screen.fill((0, 0, 0))
-    all_sprites.update()
-    all_sprites.draw(screen)
-    enemies_group.draw(screen)
-    bullets_group.draw(screen)
-
-    draw_interface()
-
-    clock.tick(FPS)
+        draw_game()
+        count_frame()
+        # панель профилировщика занимает часть экрана, как подвижный объект
+        dirty.add(profiler.draw(screen))
 
-    pygame.display.flip()
-pygame.quit()
+        with profiler.phase("wait"):
+            clock.tick(FPS)
+
+        with profiler.phase("flip"):
+            update_display()
+        profiler.end_frame()
+    close_display()
+
+
+if __name__ == "__main__":
+    main()
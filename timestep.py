@@ -0,0 +1,50 @@
+import time
+
+
+# игровые часы: время идёт только вместе с шагами симуляции,
+# поэтому таймеры не зависят ни от скорости отрисовки, ни от пауз
+class GameClock:
+    def __init__(self, tick_rate):
+        self.tick_rate = tick_rate
+        self.ticks = 0
+
+    def advance(self):
+        self.ticks += 1
+
+    # игровое время в миллисекундах (аналог pygame.time.get_ticks)
+    def now(self):
+        return self.ticks * 1000 // self.tick_rate
+
+
+# цикл с фиксированным шагом
+# реальное время между кадрами накапливается, и за кадр выполняется столько шагов логики,
+# сколько в нём поместилось, но не больше max_ticks_per_frame, чтобы после долгого кадра
+# игра не пыталась бесконечно догнать упущенное
+class FixedTimestep:
+    def __init__(self, tick_rate, max_ticks_per_frame=5, timer=time.perf_counter):
+        self.step = 1 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.timer = timer
+        self.accumulator = 0.0
+        self.last_time = None
+        self.dropped_ticks = 0  # шаги, отброшенные из-за ограничения
+
+    # сброс накопленного времени, например, после паузы или загрузки уровня
+    def reset(self):
+        self.accumulator = 0.0
+        self.last_time = None
+
+    # количество шагов логики, которые нужно выполнить в этом кадре
+    def advance(self):
+        now = self.timer()
+        if self.last_time is None:
+            self.last_time = now
+            return 1
+        self.accumulator += now - self.last_time
+        self.last_time = now
+        ticks = int(self.accumulator / self.step)
+        self.accumulator -= ticks * self.step
+        if ticks > self.max_ticks_per_frame:
+            self.dropped_ticks += ticks - self.max_ticks_per_frame
+            ticks = self.max_ticks_per_frame
+        return ticks
@@ -0,0 +1,42 @@
+# проверка прямой видимости между танками
+# луч проходит по клеткам сетки занятости карты (grid.OccupancyGrid.raycast),
+# а результат запоминается для пары клеток (наблюдатель, цель) и используется повторно,
+# пока ни один из танков не перейдёт в другую клетку
+class Visibility:
+    MAX_CACHE_SIZE = 4096
+
+    def __init__(self, grid, obstacles=()):
+        self.grid = grid
+        # подвижные препятствия (например, подбитые танки), которых нет в сетке
+        self.obstacles = obstacles
+        self.cache = {}
+        self.grid_version = grid.version
+        self.hits = 0
+        self.misses = 0
+
+    # сброс кэша, например, когда на карте появилось новое препятствие
+    def invalidate(self):
+        self.cache.clear()
+        self.grid_version = self.grid.version
+
+    # центр клетки в мировых координатах
+    def cell_center(self, cell):
+        return ((cell[0] + 0.5) * self.grid.tile_width,
+                (cell[1] + 0.5) * self.grid.tile_height)
+
+    # видит ли объект с прямоугольником source объект с прямоугольником target
+    def can_see(self, source, target):
+        if self.grid.version != self.grid_version or len(self.cache) > self.MAX_CACHE_SIZE:
+            self.invalidate()
+        key = (self.grid.cell_at(*source.center), self.grid.cell_at(*target.center))
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        x0, y0 = self.cell_center(key[0])
+        x1, y1 = self.cell_center(key[1])
+        result = self.grid.line_of_sight(x0, y0, x1, y1) and \
+            not any(obstacle.rect.clipline(x0, y0, x1, y1) for obstacle in self.obstacles)
+        self.cache[key] = result
+        return result
@@ -0,0 +1,44 @@
+import math
+
+import pygame
+
+SPAWN_DISTANCE = 600  # враги появляются не ближе этого расстояния до игрока
+SPAWN_TRIES = 32  # сколько случайных клеток проверяется на одного танка
+SPAWN_MARGIN = 16  # зазор между появившимся танком и другими танками
+SPAWN_CLEAR_RADIUS = 1  # в этом радиусе (в клетках) от центра нового танка должен быть только пол
+
+
+# индекс клеток, где может появиться вражеский танк
+# строится один раз на уровень: это клетки, где помещается танк и откуда есть путь до игрока
+# (см. pathfinding.FlowField.reachable_cells), поэтому во время боя клетку не нужно искать по карте,
+# а нужно лишь проверить, что рядом нет игрока и других танков и что танк не встанет на бонус
+# (по сетке занятости grid, см. grid.OccupancyGrid.free_cells)
+class SpawnIndex:
+    def __init__(self, cells, grid):
+        self.cells = cells
+        self.grid = grid
+        self.tile_width = grid.tile_width
+        self.tile_height = grid.tile_height
+        # сколько клеток в круге SPAWN_CLEAR_RADIUS: столько свободных клеток должно быть вокруг места
+        r = SPAWN_CLEAR_RADIUS
+        self.clear_cells = sum(2 * math.isqrt(r * r - dy * dy) + 1 for dy in range(-r, r + 1))
+
+    # место для танка размером size: левый верхний угол или None, если подходящая клетка не нашлась
+    # away_from - точка, от которой танк должен быть не ближе min_distance (центр игрока),
+    # is_occupied(rect) - занято ли место другими танками или препятствиями
+    def pick(self, rng, size, away_from, is_occupied, min_distance=SPAWN_DISTANCE, tries=SPAWN_TRIES):
+        if not self.cells:
+            return None
+        ax, ay = away_from
+        rect = pygame.Rect((0, 0), size)
+        for _ in range(tries):
+            x, y = self.cells[rng.randrange(len(self.cells))]
+            rect.center = (int((x + 0.5) * self.tile_width), int((y + 0.5) * self.tile_height))
+            if (rect.centerx - ax) ** 2 + (rect.centery - ay) ** 2 < min_distance * min_distance:
+                continue
+            if len(self.grid.free_cells(x, y, SPAWN_CLEAR_RADIUS)) < self.clear_cells:
+                continue
+            if is_occupied(rect.inflate(SPAWN_MARGIN * 2, SPAWN_MARGIN * 2)):
+                continue
+            return rect.topleft
+        return None